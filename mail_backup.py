@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 
 import logging
+import queue
 import sys
 import logging.handlers
 
 from src.config import ConfigKey, Config
 from src.constant import Constant
+from src.log_filter import DebugLogFilter
 from src.message_exception import MessageException
+from src.relayouter import Relayouter
 from src.runner import Runner
 
 
@@ -14,6 +17,11 @@ _logger = logging.getLogger("main")
 
 
 def init_logging(config):
+    """
+    Log records are passed via a queue to a background listener, which writes them to the (slow) file or console.
+    :return: (listener, to be stopped (flushed) on exit; debug filter or None)
+    :rtype: Tuple[logging.handlers.QueueListener, Optional[DebugLogFilter]]
+    """
     handlers = []
 
     format_simple = '[%(levelname)8s]: %(message)s'
@@ -38,24 +46,43 @@ def init_logging(config):
     format_ = format_with_ts if log_file else format_simple
 
     if print_console or not log_file:
-        handlers.append(logging.StreamHandler(sys.stdout))
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(format_))
+        handlers.append(handler)
+
+    log_queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+
+    debug_sample = Config.get_int(config, ConfigKey.LOG_DEBUG_SAMPLE, 1)
+    debug_rate_limit = Config.get_int(config, ConfigKey.LOG_DEBUG_RATE_LIMIT, 0)
+    debug_filter = None
+    if debug_sample > 1 or debug_rate_limit > 0:
+        debug_filter = DebugLogFilter(debug_sample, debug_rate_limit)
+        queue_handler.addFilter(debug_filter)
 
-    logging.basicConfig(
-        format=format_,
-        level=log_level,
-        handlers=handlers
-    )
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    root_logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener, debug_filter
 
 
 def main():
+    listener, debug_filter = None, None
 
     try:
         config = Config.load()
 
-        init_logging(config)
+        listener, debug_filter = init_logging(config)
 
-        runner = Runner(config)
-        runner.run()
+        if Config.get_bool(config, ConfigKey.RELAYOUT, False):
+            relayouter = Relayouter(config)
+            relayouter.run()
+        else:
+            runner = Runner(config)
+            runner.run()
 
         return 0
 
@@ -74,6 +101,12 @@ def main():
         # no runner.close() to signal abnormal termination!
         return 1
 
+    finally:
+        if debug_filter:
+            debug_filter.report_suppressed()
+        if listener:
+            listener.stop()
+
 
 if __name__ == '__main__':
     sys.exit(main())
@@ -18,6 +18,8 @@ class ConfigKey(Enum):
     LOG_MAX_BYTES = "log_max_bytes"
     LOG_MAX_COUNT = "log_max_count"
     LOG_PRINT = "log_print"
+    LOG_DEBUG_SAMPLE = "log_debug_sample"
+    LOG_DEBUG_RATE_LIMIT = "log_debug_rate_limit"
 
     IMAP_HOST = "imap_host"
     IMAP_PORT = "imap_port"
@@ -25,6 +27,25 @@ class ConfigKey(Enum):
     IMAP_PASSWORD = "imap_password"
     IMAP_FOLDERS = "imap_folders"
 
+    MESSAGE_INDEX = "message_index"
+    RUN_HISTORY = "run_history"
+    MAX_RUNTIME = "max_runtime"
+    DECODE_WORKERS = "decode_workers"
+    PROFILE = "profile"
+
+    S3_ENDPOINT = "s3_endpoint"
+    S3_REGION = "s3_region"
+    S3_BUCKET = "s3_bucket"
+    S3_PREFIX = "s3_prefix"
+    S3_ACCESS_KEY = "s3_access_key"
+    S3_SECRET_KEY = "s3_secret_key"
+    S3_WORKERS = "s3_workers"
+    S3_MULTIPART_THRESHOLD = "s3_multipart_threshold"
+    S3_MANIFEST = "s3_manifest"
+
+    RELAYOUT = "relayout"
+    RELAYOUT_WORKERS = "relayout_workers"
+
 
 class Config:
 
@@ -68,6 +89,9 @@ class Config:
         handle_cli(ConfigKey.LOG_MAX_COUNT)
         handle_cli(ConfigKey.LOG_PRINT)
         handle_cli(ConfigKey.IMAP_PASSWORD)
+        handle_cli(ConfigKey.RELAYOUT)
+        handle_cli(ConfigKey.MAX_RUNTIME)
+        handle_cli(ConfigKey.PROFILE)
 
     @classmethod
     def create_cli_parser(cls):
@@ -100,6 +124,26 @@ class Config:
             "-s", "--" + ConfigKey.IMAP_PASSWORD.value,
             help="secret IMAP password"
         )
+        parser.add_argument(
+            "-t", "--" + ConfigKey.MAX_RUNTIME.value,
+            type=int,
+            help="max runtime in seconds; folders get scheduled by expected cost and resumed next time"
+        )
+        parser.add_argument(
+            "--" + ConfigKey.PROFILE.value,
+            nargs="?",
+            const=Constant.DEFAULT_PROFILE_DIR,
+            metavar="REPORT_DIR",
+            help="profile CPU and memory, reports per folder are written to REPORT_DIR (default: {})".format(
+                Constant.DEFAULT_PROFILE_DIR
+            )
+        )
+        parser.add_argument(
+            "-r", "--" + ConfigKey.RELAYOUT.value,
+            action="store_true",
+            default=None,
+            help="move existing mail files from 'former_path' to 'path' (no download)"
+        )
 
         return parser
 
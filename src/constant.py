@@ -10,3 +10,11 @@ class Constant:
     DEFAULT_LOGLEVEL = logging.INFO
     DEFAULT_LOG_MAX_BYTES = 1048576
     DEFAULT_LOG_MAX_COUNT = 5
+
+    DEFAULT_RELAYOUT_WORKERS = 8
+
+    DEFAULT_S3_WORKERS = 8
+    DEFAULT_S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+    DEFAULT_S3_MANIFEST = "./.s3-manifest.json"
+
+    DEFAULT_PROFILE_DIR = "./profile"
@@ -0,0 +1,85 @@
+import logging
+from typing import Dict, List, Optional
+
+from src.run_history import FolderHistory, RunHistory
+
+_logger = logging.getLogger(__name__)
+
+
+class FolderScheduler:
+    """
+    Orders folders by expected cost (cheapest first), so that small folders are served even if the run time budget
+    is used up by a big catch-up. Based on IMAP STATUS data (MESSAGES, UIDNEXT, UIDVALIDITY) and the run history:
+    the expected seconds of a folder come from its own former timing, else from its expected bytes at the overall
+    transfer rate of all folders.
+    """
+
+    DEFAULT_SECONDS_PER_MAIL = 0.1
+
+    @classmethod
+    def get_resume_uid(cls, status: Dict[str, int], history: Optional[FolderHistory]) -> Optional[int]:
+        """:return: checkpoint of an incomplete former run, if still valid"""
+        if not history or history.resume_uid is None:
+            return None
+        if history.uid_validity != status.get("UIDVALIDITY"):
+            return None  # UIDs were reassigned by the server
+        return history.resume_uid
+
+    @classmethod
+    def estimate_mails(cls, status: Dict[str, int], history: Optional[FolderHistory], last_days: Optional[int]) -> int:
+        messages = status.get("MESSAGES", 0)
+        uid_next = status.get("UIDNEXT")
+
+        resume_uid = cls.get_resume_uid(status, history)
+        if resume_uid is not None and uid_next:
+            return min(messages, max(0, uid_next - resume_uid - 1))
+
+        if last_days and history and history.uid_validity == status.get("UIDVALIDITY") and history.uid_next and uid_next:
+            new_messages = max(0, uid_next - history.uid_next)
+            return min(messages, history.mails + new_messages)
+
+        return messages
+
+    @classmethod
+    def schedule(cls, folder_configs: List, statuses: Dict[str, Dict[str, int]], run_history: Optional[RunHistory]) -> List:
+        """
+        :param List[FolderConfig] folder_configs: only folders which exist on the server
+        :param statuses: IMAP STATUS per folder name
+        :param run_history: may be None
+        :rtype: List[FolderConfig]
+        """
+        histories = {fc.name: run_history.get(fc.name) if run_history else None for fc in folder_configs}
+
+        known = [h for h in histories.values() if h and h.mails]
+        bytes_per_mail = sum(h.bytes for h in known) / sum(h.mails for h in known) if known else None
+
+        timed = [h for h in known if h.seconds > 0]
+        total_seconds = sum(h.seconds for h in timed)
+        total_bytes = sum(h.bytes for h in timed)
+        default_seconds_per_mail = total_seconds / sum(h.mails for h in timed) if timed else cls.DEFAULT_SECONDS_PER_MAIL
+        bytes_per_second = total_bytes / total_seconds if total_bytes and timed else None
+
+        costs = {}
+        for folder_config in folder_configs:
+            history = histories[folder_config.name]
+            mails = cls.estimate_mails(statuses.get(folder_config.name, {}), history, folder_config.last_days)
+
+            if history and history.mails:
+                estimated_bytes = mails * history.bytes // history.mails
+            elif bytes_per_mail is not None:
+                estimated_bytes = int(mails * bytes_per_mail)
+            else:
+                estimated_bytes = None
+
+            if history and history.mails and history.seconds > 0:
+                seconds = mails * history.seconds / history.mails
+            elif estimated_bytes is not None and bytes_per_second:
+                seconds = estimated_bytes / bytes_per_second  # no own timing: transfer time at the overall rate
+            else:
+                seconds = mails * default_seconds_per_mail
+
+            costs[folder_config.name] = seconds
+            _logger.debug("folder '%s' - expected: %s mails, %s bytes, %.1fs.",
+                          folder_config.name, mails, estimated_bytes if estimated_bytes is not None else "?", seconds)
+
+        return sorted(folder_configs, key=lambda fc: costs[fc.name])  # stable sort keeps config order for equal costs
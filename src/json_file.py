@@ -0,0 +1,32 @@
+import json
+import logging
+import os
+from typing import Optional
+
+_logger = logging.getLogger(__name__)
+
+
+class JsonFile:
+    """Loads and saves the JSON state files (message index, run history, S3 manifest)."""
+
+    @classmethod
+    def load(cls, file_path, description) -> Optional[any]:
+        """
+        :param description: for logging, e.g. "message index"
+        :return: content or None if the file does not exist yet
+        """
+        if not os.path.isfile(file_path):
+            _logger.info("no %s found (%s), starting empty.", description, file_path)
+            return None
+
+        with open(file_path, "r") as file:
+            return json.load(file)
+
+    @classmethod
+    def save(cls, file_path, data, indent=0):
+        """Writes a temporary file first, so an interrupted run cannot leave a truncated file."""
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        temp_path = file_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(data, file, indent=indent, sort_keys=True)
+        os.replace(temp_path, file_path)
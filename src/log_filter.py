@@ -0,0 +1,65 @@
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class DebugLogFilter(logging.Filter):
+    """
+    Samples and rate-limits the per mail debug records of high volume runs. Per mail records are logged via the
+    loggers of `get_mail_logger`; all other records pass always.
+    """
+
+    MAIL_LOGGER_SUFFIX = ".mail"
+
+    def __init__(self, sample: int = 1, rate_limit: int = 0):
+        """
+        :param sample: keep only every n-th debug record (1 = all)
+        :param rate_limit: max debug records per second (0 = unlimited)
+        """
+        super().__init__()
+        self._sample = max(1, sample)
+        self._rate_limit = max(0, rate_limit)
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._window_start = 0.0
+        self._window_count = 0
+        self._suppressed = 0
+
+    @classmethod
+    def get_mail_logger(cls, name) -> logging.Logger:
+        """:return: child logger of `name` for per mail records"""
+        return logging.getLogger(name + cls.MAIL_LOGGER_SUFFIX)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG or not record.name.endswith(self.MAIL_LOGGER_SUFFIX):
+            return True
+
+        with self._lock:
+            self._counter += 1
+            if (self._counter - 1) % self._sample != 0:
+                return False
+
+            if self._rate_limit > 0:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+                    if self._suppressed:
+                        record.msg = "{} [{} debug lines suppressed]".format(record.msg, self._suppressed)
+                        self._suppressed = 0
+
+                if self._window_count >= self._rate_limit:
+                    self._suppressed += 1
+                    return False
+                self._window_count += 1
+
+        return True
+
+    def report_suppressed(self):
+        """Logs the suppressed records not reported yet (no debug record followed); call before the log output stops."""
+        with self._lock:
+            suppressed, self._suppressed = self._suppressed, 0
+        if suppressed:
+            _logger.info("[%s debug lines suppressed]", suppressed)
@@ -0,0 +1,66 @@
+import multiprocessing
+import signal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from src.mail_message_ext import MailMessageExt
+from src.naming_utils import NamingUtils
+
+
+def _init_worker():
+    # shutdown is handled by the main process (signals sent to the whole process group reach the workers too)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+def decode_mail(uid: Optional[str], raw_data: bytes) -> Tuple[Dict[str, any], Dict[str, tuple]]:
+    """
+    Runs in a worker process: parses a mail and extracts the naming attributes.
+    :return: (attributes, headers needed by the main process)
+    """
+    mail = MailMessageExt.from_bytes(raw_data)
+    mail.uid = uid  # overrides cached property, the UID is not part of the message data
+    attributes = NamingUtils.extract_attributes(mail)
+    headers = {k: v for k, v in mail.headers.items() if k in MailDecoder.HEADERS}
+    return attributes, headers
+
+
+class MailDecoder:
+    """
+    Parses fetched mails (MIME, unidecode) in a process pool, so decoding scales with CPU cores instead of being
+    limited by the GIL of the fetching thread. Results are returned in fetch order.
+    """
+
+    HEADERS = ["message-id"]  # used by MessageIndex
+    PENDING_PER_WORKER = 4  # limits fetched but not yet handled mails (and so memory)
+
+    def __init__(self, workers: int):
+        self._workers = workers
+        # no "fork": the process has threads then (log listener, S3 uploads), forking them may deadlock on their locks
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                             mp_context=multiprocessing.get_context("forkserver"))
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def decode(self, mails: Iterable[MailMessageExt]) -> Iterator[Tuple[MailMessageExt, Dict[str, any]]]:
+        """
+        :return: (mail, naming attributes); the decoded headers are set at the mail, so it is not parsed again
+        """
+        pending = deque()
+        max_pending = self._workers * self.PENDING_PER_WORKER
+
+        def pop_result():
+            pending_mail, future = pending.popleft()
+            attributes, headers = future.result()
+            pending_mail.headers = headers  # overrides cached property
+            return pending_mail, attributes
+
+        for mail in mails:
+            pending.append((mail, self._executor.submit(decode_mail, mail.uid, mail.raw_data)))
+            if len(pending) >= max_pending:
+                yield pop_result()
+
+        while pending:
+            yield pop_result()
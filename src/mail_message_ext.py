@@ -1,9 +1,42 @@
+import email
+from functools import cached_property
+
 from imap_tools import MailMessage
 
 
 class MailMessageExt(MailMessage):
 
+    HEADER_CHUNK_SIZE = 8192
+
     def __init__(self, fetch_data: list):
-        super().__init__(fetch_data)
+        # no super().__init__: parsing is deferred until first use, so it may happen in a worker process (MailDecoder)
+        self.raw_data, self._raw_uid_data, self._raw_flag_data = self._get_message_data_parts(fetch_data)
+
+    @cached_property
+    def obj(self):
+        return email.message_from_bytes(self.raw_data)
+
+    @classmethod
+    def from_file(cls, file_path, headers_only=False):
+        """
+        Loads a stored eml file.
+        :param str file_path:
+        :param bool headers_only: read only the header block (until the first empty line)
+        :rtype: MailMessageExt
+        """
+        with open(file_path, "rb") as file:
+            if not headers_only:
+                return cls.from_bytes(file.read())
+
+            data = b""
+            while True:
+                chunk = file.read(cls.HEADER_CHUNK_SIZE)
+                if not chunk:
+                    break
+                data += chunk
+                for separator in (b"\r\n\r\n", b"\n\n"):
+                    pos = data.find(separator)
+                    if pos >= 0:
+                        return cls.from_bytes(data[:pos + len(separator)])
 
-        self.raw_data, _, _ = super()._get_message_data_parts(fetch_data)
+            return cls.from_bytes(data)
@@ -0,0 +1,94 @@
+import logging
+import os
+from typing import Dict, List, Optional
+
+from src.json_file import JsonFile
+
+_logger = logging.getLogger(__name__)
+
+
+class MessageIndex:
+    """
+    Maps message identifiers to already stored mail files, so that mails moved between IMAP folders are copied
+    locally instead of downloaded again. Identifiers are the "Message-ID" header and - if the server provides
+    them - server side object ids (EMAILID, RFC 8474; X-GM-MSGID, Gmail).
+    """
+
+    KEY_MESSAGE_ID = "message-id"
+
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._entries: Dict[str, str] = {}
+        self._changed = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        entries = JsonFile.load(self._file_path, "message index")
+        if entries is None:
+            return
+
+        self._entries = entries
+        self._changed = False
+        _logger.debug("message index loaded (%s entries).", len(self._entries))
+
+    def save(self):
+        if not self._changed:
+            return
+
+        JsonFile.save(self._file_path, self._entries)
+        self._changed = False
+        _logger.debug("message index saved (%s entries).", len(self._entries))
+
+    @classmethod
+    def get_keys(cls, mail, server_id: Optional[str] = None) -> List[str]:
+        """
+        :param MailMessageExt mail: headers are sufficient
+        :param Optional[str] server_id: e.g. "EMAILID:M6d99ac3275bb4e"
+        :return: index keys, the most reliable first
+        """
+        keys = []
+        if server_id:
+            keys.append(server_id)
+
+        message_ids = mail.headers.get(cls.KEY_MESSAGE_ID)
+        if message_ids and message_ids[0].strip():
+            keys.append("{}:{}".format(cls.KEY_MESSAGE_ID, message_ids[0].strip()))
+
+        return keys
+
+    def find(self, keys: List[str], size: int) -> Optional[str]:
+        """
+        :param keys: see get_keys
+        :param size: server side message size; the stored file has to match, otherwise the entry is not trusted
+        :return: path of the stored mail file or None
+        """
+        if size <= 0:
+            return None
+
+        for key in keys:
+            mail_path = self._entries.get(key)
+            if not mail_path:
+                continue
+            if os.path.isfile(mail_path) and os.path.getsize(mail_path) == size:
+                return mail_path
+            if not os.path.isfile(mail_path):
+                del self._entries[key]  # outdated (e.g. deleted or relayouted)
+                self._changed = True
+
+        return None
+
+    def move_paths(self, moves: Dict[str, str]):
+        """:param moves: old path => new path of moved files (relayout)"""
+        for key, mail_path in self._entries.items():
+            new_mail_path = moves.get(mail_path)
+            if new_mail_path:
+                self._entries[key] = new_mail_path
+                self._changed = True
+
+    def add(self, keys: List[str], mail_path: str):
+        for key in keys:
+            if self._entries.get(key) != mail_path:
+                self._entries[key] = mail_path
+                self._changed = True
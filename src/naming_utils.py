@@ -1,6 +1,8 @@
 import os
 import re
+import string
 from datetime import datetime
+from glob import escape as glob_escape
 
 from unidecode import unidecode
 
@@ -13,10 +15,49 @@ class NamingUtils:
 
     MAX_ATTRIBUTE_LENGTH = 32
 
+    NUMERIC_KEYS = [NamingKey.UID, NamingKey.YEAR, NamingKey.MONTH, NamingKey.DAY, NamingKey.HOUR, NamingKey.MINUTE]
+
     @classmethod
     def format_path(cls, pattern, attributes) -> str:
         return pattern.format(**attributes)
 
+    @classmethod
+    def pattern_to_glob(cls, pattern) -> str:
+        """Converts a path pattern into a glob expression, which matches all files created by this pattern."""
+        parts = []
+        for literal, field_name, _, _ in string.Formatter().parse(pattern):
+            parts.append(glob_escape(literal))
+            if field_name is not None:
+                parts.append("*")
+        return "".join(parts)
+
+    @classmethod
+    def pattern_to_regex(cls, pattern):
+        """
+        Converts a path pattern into a regular expression, which extracts the (prepared) attributes from a path.
+        Postfixed paths ("mail.eml" => "mail.2.eml"), as created in `compare` mode, are matched too.
+        :rtype: re.Pattern
+        """
+        file_path, file_extension = os.path.splitext(pattern)
+        if "{" in file_extension:
+            file_path, file_extension = pattern, ""
+
+        parts = []
+        used_names = set()
+        for literal, field_name, _, _ in string.Formatter().parse(file_path):
+            parts.append(re.escape(literal))
+            if field_name is not None:
+                if field_name in used_names:
+                    parts.append("(?P={})".format(field_name))
+                else:
+                    used_names.add(field_name)
+                    numeric = field_name in [k.name for k in cls.NUMERIC_KEYS]
+                    parts.append("(?P<{}>{})".format(field_name, "[0-9]*" if numeric else "[a-zA-Z0-9.-]*?"))
+        parts.append(r"(?:\.\d+)?")
+        parts.append(re.escape(file_extension))
+
+        return re.compile("^" + "".join(parts) + "$")
+
     @classmethod
     def join_path(cls, pivot, mail_path) -> str:
         if mail_path.startswith("/"):
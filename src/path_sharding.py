@@ -0,0 +1,81 @@
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+
+
+class PathSharding:
+    """
+    Keeps mail directories small: once a directory holds `max_files` files, new files go into hashed sub directories
+    ("2021-04/mail.eml" => "2021-04/3f/mail.eml"). The sub directory depends only on the file name, so a mail is always
+    found either in its shard or - written before sharding started - in the directory itself.
+    """
+
+    SHARD_DIGITS = 2  # => 256 sub directories
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file_counts: Dict[str, int] = {}
+
+    @classmethod
+    def get_shard_path(cls, mail_path) -> str:
+        mail_dir, file_name = os.path.split(mail_path)
+        shard = hashlib.md5(file_name.encode()).hexdigest()[:cls.SHARD_DIGITS]
+        return os.path.join(mail_dir, shard, file_name)
+
+    @classmethod
+    def get_unsharded_path(cls, mail_path) -> Optional[str]:
+        """
+        Reverts get_shard_path (postfixed files of `compare` mode included).
+        :return: path without shard directory or None if the path is not located in a shard directory
+        """
+        shard_dir, file_name = os.path.split(mail_path)
+        mail_dir, shard = os.path.split(shard_dir)
+        if len(shard) == cls.SHARD_DIGITS and all(c in "0123456789abcdef" for c in shard):
+            return os.path.join(mail_dir, file_name)
+        return None
+
+    @classmethod
+    def get_shard_glob(cls, glob_pattern) -> str:
+        """Extends a glob expression for files to match their sharded files."""
+        mail_dir, file_name = os.path.split(glob_pattern)
+        return os.path.join(mail_dir, "[0-9a-f]" * cls.SHARD_DIGITS, file_name)
+
+    @classmethod
+    def find_existing(cls, mail_path) -> Optional[str]:
+        for candidate in (mail_path, cls.get_shard_path(mail_path)):
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def resolve(self, mail_path, max_files: Optional[int]) -> str:
+        """
+        :param mail_path: path as formatted by the folder pattern
+        :param max_files: max files per directory, None or 0 disables sharding
+        :return: path of an existing file or path to write a new file
+        """
+        if not max_files or max_files <= 0:
+            return mail_path
+
+        existing_path = self.find_existing(mail_path)
+        if existing_path:
+            return existing_path
+
+        mail_dir = os.path.dirname(mail_path)
+        with self._lock:
+            count = self._file_counts.get(mail_dir)
+            if count is None:
+                count = self.count_files(mail_dir)
+            if count >= max_files:
+                self._file_counts[mail_dir] = count
+                return self.get_shard_path(mail_path)
+
+            self._file_counts[mail_dir] = count + 1  # will be written
+            return mail_path
+
+    @classmethod
+    def count_files(cls, dir_path) -> int:
+        if not os.path.isdir(dir_path):
+            return 0
+        with os.scandir(dir_path) as entries:
+            return sum(1 for e in entries if e.is_file(follow_symlinks=False))
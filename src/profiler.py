@@ -0,0 +1,158 @@
+import cProfile
+import hashlib
+import io
+import logging
+import os
+import pstats
+import tracemalloc
+from typing import Dict, List, Optional
+
+from src.naming_utils import NamingUtils
+
+_logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """
+    Profiles CPU (cProfile) and memory (tracemalloc) per folder. Reports are written as files with stable names
+    ("<folder>-<hash>.txt", "<folder>-<hash>.prof"), so they can be compared between releases.
+    """
+
+    FUNCTIONS = ["handle_mail", "extract_attributes", "find_identical_file_or_new_mail_path"]
+    SIZE_BUCKETS = [(10 * 1024, "<10KB"), (100 * 1024, "<100KB"), (1024 * 1024, "<1MB"), (None, ">=1MB")]
+    SAMPLES_PER_BUCKET = 10  # memory snapshots are expensive
+    TOP_COUNT = 30
+    TOP_ALLOCATORS = 10
+
+    def __init__(self, report_dir):
+        self._report_dir = report_dir
+        self._folder_name = None
+        self._profile = None
+        self._bucket_mails: Dict[str, int] = {}
+        self._bucket_bytes: Dict[str, int] = {}
+        self._bucket_samples: Dict[str, int] = {}
+        self._bucket_allocators: Dict[str, Dict[str, List[int]]] = {}  # traceback => [size, count]
+
+    def close(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @classmethod
+    def get_bucket(cls, size: int) -> str:
+        for limit, label in cls.SIZE_BUCKETS:
+            if limit is None or size < limit:
+                return label
+
+    @classmethod
+    def get_mail_bucket(cls, mail) -> str:
+        return cls.get_bucket(cls.get_mail_size(mail))
+
+    @classmethod
+    def get_mail_size(cls, mail) -> int:
+        """Server side size first: of indexed mails only the headers are fetched (the file is copied later)."""
+        return mail.size_rfc822 or len(mail.raw_data)
+
+    @classmethod
+    def take_snapshot(cls):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+
+    def start_folder(self, folder_name):
+        self._folder_name = folder_name
+        self._bucket_mails, self._bucket_bytes, self._bucket_samples, self._bucket_allocators = {}, {}, {}, {}
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def before_mail(self, bucket: str) -> Optional[tracemalloc.Snapshot]:
+        """
+        Call before handling a mail.
+        :param bucket: see get_mail_bucket
+        :return: memory snapshot to pass to `sample_mail`, if the size bucket of the mail still needs samples
+        """
+        if self._bucket_samples.get(bucket, 0) >= self.SAMPLES_PER_BUCKET:
+            return None
+
+        self._profile.disable()
+        snapshot = self.take_snapshot()
+        self._profile.enable()
+        return snapshot
+
+    def sample_mail(self, mail, bucket: str, snapshot: Optional[tracemalloc.Snapshot]):
+        """
+        Call after handling a mail, while it is still referenced: memory held compared to `snapshot` (taken by
+        `before_mail`) is attributed to the size bucket of the mail.
+        """
+        size = self.get_mail_size(mail)
+        self._bucket_mails[bucket] = self._bucket_mails.get(bucket, 0) + 1
+        self._bucket_bytes[bucket] = self._bucket_bytes.get(bucket, 0) + size
+
+        samples = self._bucket_samples.get(bucket, 0)
+        if snapshot is None or samples >= self.SAMPLES_PER_BUCKET:
+            return
+        self._bucket_samples[bucket] = samples + 1
+
+        self._profile.disable()
+        allocators = self._bucket_allocators.setdefault(bucket, {})
+        for diff in self.take_snapshot().compare_to(snapshot, "lineno"):
+            if diff.size_diff > 0:
+                entry = allocators.setdefault(str(diff.traceback), [0, 0])
+                entry[0] += diff.size_diff
+                entry[1] += diff.count_diff
+        self._profile.enable()
+
+    def stop_folder(self):
+        self._profile.disable()
+
+        os.makedirs(self._report_dir, exist_ok=True)
+        base_path = os.path.join(self._report_dir, self.get_report_name(self._folder_name))
+        self._profile.dump_stats(base_path + ".prof")
+        with open(base_path + ".txt", "w") as file:
+            file.write(self.format_report())
+        _logger.info("folder '%s' - profile written (%s.txt).", self._folder_name, base_path)
+
+        self._profile = None
+
+    @classmethod
+    def get_report_name(cls, folder_name) -> str:
+        """Readable and stable, the hash keeps folders apart which are equal after cleanup (e.g. "A/B" and "A.B")."""
+        folder_hash = hashlib.md5(folder_name.encode()).hexdigest()[:8]
+        return "{}-{}".format(NamingUtils.prepare_text(folder_name, 100) or "folder", folder_hash)
+
+    def format_report(self) -> str:
+        output = io.StringIO()
+        output.write("folder: {}\n\n".format(self._folder_name))
+
+        stats = pstats.Stats(self._profile, stream=output)
+        output.write("# cumulative time\n")
+        output.write("{:>10} {:>12}  function\n".format("calls", "cumtime"))
+        for function in self.FUNCTIONS:
+            calls, cumtime = 0, 0.0
+            for (_, _, name), (_, nc, _, ct, _) in stats.stats.items():
+                if name == function:
+                    calls += nc
+                    cumtime += ct
+            output.write("{:>10} {:>12.6f}  {}\n".format(calls, cumtime, function))
+
+        output.write("\n# memory by message size bucket (average of sampled mails)\n")
+        for _, bucket in self.SIZE_BUCKETS:
+            mails = self._bucket_mails.get(bucket, 0)
+            samples = self._bucket_samples.get(bucket, 0)
+            output.write("\n## {}: {} mails, {} bytes, {} sampled\n".format(
+                bucket, mails, self._bucket_bytes.get(bucket, 0), samples
+            ))
+            allocators = self._bucket_allocators.get(bucket, {})
+            top = sorted(allocators.items(), key=lambda i: i[1][0], reverse=True)[:self.TOP_ALLOCATORS]
+            for traceback, (size, count) in top:
+                output.write("{:>12} B {:>8} blocks  {}\n".format(size // samples, count // samples, traceback))
+
+        output.write("\n# top functions (cumulative)\n")
+        stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.TOP_COUNT)
+
+        return output.getvalue()
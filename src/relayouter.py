@@ -0,0 +1,217 @@
+import glob
+import logging
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Dict, Optional
+
+from src.config import Config, ConfigKey
+from src.constant import Constant
+from src.log_filter import DebugLogFilter
+from src.mail_message_ext import MailMessageExt
+from src.message_exception import MessageException
+from src.message_index import MessageIndex
+from src.naming_key import NamingKey
+from src.naming_utils import NamingUtils
+from src.path_sharding import PathSharding
+from src.runner import FolderConfig, Runner
+from src.s3_mirror import S3Mirror
+
+_logger = logging.getLogger(__name__)
+_mail_logger = DebugLogFilter.get_mail_logger(__name__)
+
+
+class RelayoutResult(Enum):
+    MOVED = "moved"
+    UNCHANGED = "unchanged"
+    DUPLICATE = "duplicate"
+    UNMATCHED = "unmatched"
+    FAILED = "failed"
+
+    def __str__(self):
+        return self.__repr__()
+
+    def __repr__(self) -> str:
+        return '{}'.format(self.name)
+
+
+class Relayouter:
+    """
+    Moves already downloaded mail files from the `former_path` pattern of a folder configuration to its current `path`.
+    Only the header block of each file is read, nothing gets downloaded.
+    """
+
+    def __init__(self, config):
+        self._config = config
+        self._shutdown = False
+        self._locks_lock = threading.Lock()
+        self._dir_locks: Dict[str, threading.Lock] = {}
+        self._counts = {r: 0 for r in RelayoutResult}
+        self._path_sharding = PathSharding()
+
+        signal.signal(signal.SIGINT, self._shutdown_gracefully)
+        signal.signal(signal.SIGTERM, self._shutdown_gracefully)
+
+        self._folder_configs = Runner.parse_folder_configs(self._config)
+        self._pivot_path = config[ConfigKey.PIVOT_PATH.value]
+        self._workers = Config.get_int(self._config, ConfigKey.RELAYOUT_WORKERS, Constant.DEFAULT_RELAYOUT_WORKERS)
+
+        self._moves_lock = threading.Lock()
+        self._moves: Dict[str, str] = {}  # old path => new path (or identical file of a removed duplicate)
+        self._message_index: Optional[MessageIndex] = None
+        message_index_path = Config.get_str(self._config, ConfigKey.MESSAGE_INDEX)
+        if message_index_path:
+            self._message_index = MessageIndex(NamingUtils.join_path(self._pivot_path, message_index_path))
+        self._s3_mirror: Optional[S3Mirror] = None
+        if Config.get_str(self._config, ConfigKey.S3_BUCKET):
+            self._s3_mirror = S3Mirror(self._config, self._pivot_path)
+
+    def _shutdown_gracefully(self, sig, _frame):
+        _logger.info("shutdown signaled (%s)", sig)
+        self._shutdown = True
+
+    def _get_dir_lock(self, dir_path) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._dir_locks.get(dir_path)
+            if lock is None:
+                lock = self._dir_locks[dir_path] = threading.Lock()
+            return lock
+
+    def run(self):
+        if self._message_index is not None:
+            self._message_index.load()
+        if self._s3_mirror is not None:
+            self._s3_mirror.load()
+
+        try:
+            for folder_config in self._folder_configs:
+                if self._shutdown:
+                    break
+                self.relayout_folder(folder_config)
+        finally:
+            if self._message_index is not None:
+                self._message_index.move_paths(self._moves)
+                self._message_index.save()
+            if self._s3_mirror is not None:
+                for mail_path, new_mail_path in self._moves.items():
+                    self._s3_mirror.move(mail_path, new_mail_path)
+                self._s3_mirror.close()
+
+        _logger.info("relayout finished: %s moved, %s unchanged, %s duplicates removed, %s unmatched, %s failed.",
+                     *[self._counts[r] for r in RelayoutResult])
+
+    def relayout_folder(self, folder_config: FolderConfig):
+        folder_info = "folder '{}' - ".format(folder_config.name)
+
+        former_path = folder_config.former_path
+        if not former_path or former_path == folder_config.path:
+            _logger.debug("%sno former path configured, nothing to relayout.", folder_info)
+            return
+
+        uid_token = "{" + NamingKey.UID.name + "}"
+        if uid_token in folder_config.path and uid_token not in former_path:
+            raise MessageException("cannot relayout folder '{}': 'path' uses {} but 'former_path' does not!".format(
+                folder_config.name, uid_token
+            ))
+
+        former_pattern = NamingUtils.join_path(self._pivot_path, former_path)
+        former_regex = NamingUtils.pattern_to_regex(former_pattern)
+        former_glob = NamingUtils.pattern_to_glob(former_pattern)
+        mail_paths = sorted(glob.glob(former_glob) + glob.glob(PathSharding.get_shard_glob(former_glob)))
+        _logger.info("%sfound %s files to relayout.", folder_info, len(mail_paths))
+
+        stop_dir = os.path.realpath(os.path.dirname(former_pattern.split("{")[0] + "_"))  # static part of the pattern
+
+        def relayout(mail_path):
+            if self._shutdown:
+                return None
+            try:
+                result = self.relayout_file(mail_path, former_regex, stop_dir, folder_config)
+            except Exception as ex:
+                _logger.error("%scannot relayout mail (%s): %s", folder_info, mail_path, ex)
+                result = RelayoutResult.FAILED
+            return result
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            for result in executor.map(relayout, mail_paths):
+                if result is not None:
+                    self._counts[result] += 1
+
+    def relayout_file(self, mail_path, former_regex, stop_dir, folder_config: FolderConfig) -> RelayoutResult:
+        folder_info = "folder '{}' - ".format(folder_config.name)
+
+        match = former_regex.match(mail_path)
+        unsharded_path = PathSharding.get_unsharded_path(mail_path)
+        if not match and unsharded_path:
+            match = former_regex.match(unsharded_path)
+        if not match:
+            _logger.warning("%sskip file not matching former path (%s).", folder_info, mail_path)
+            return RelayoutResult.UNMATCHED
+
+        mail = MailMessageExt.from_file(mail_path, headers_only=True)
+        attributes = NamingUtils.extract_attributes(mail)
+        attributes[NamingKey.UID.name] = match.groupdict().get(NamingKey.UID.name, "")
+
+        new_mail_path = NamingUtils.format_path(folder_config.path, attributes)
+        new_mail_path = os.path.realpath(NamingUtils.join_path(self._pivot_path, new_mail_path))
+        mail_path = os.path.realpath(mail_path)
+
+        # colliding names share the (unsharded) target directory, so existence checks and renames are consistent
+        # between workers, while files with different targets are moved in parallel
+        with self._get_dir_lock(os.path.dirname(new_mail_path)):
+            if PathSharding.find_existing(new_mail_path) == mail_path:
+                return RelayoutResult.UNCHANGED
+            formatted_path = new_mail_path
+            new_mail_path = self._path_sharding.resolve(formatted_path, folder_config.shard_max_files)
+
+            if os.path.isfile(new_mail_path):
+                mail = MailMessageExt.from_file(mail_path)
+                new_mail_path, identical_path = Runner.find_identical_file_or_new_mail_path(
+                    mail, formatted_path, folder_config,
+                    lambda p: self._path_sharding.resolve(p, folder_config.shard_max_files)
+                )
+                if identical_path == mail_path:
+                    return RelayoutResult.UNCHANGED  # already stored as postfixed file
+                if not new_mail_path and not identical_path:
+                    return RelayoutResult.FAILED  # no free postfixed path, keep the file
+                if not new_mail_path:
+                    os.remove(mail_path)
+                    self._add_move(mail_path, identical_path)
+                    self._remove_empty_dirs(os.path.dirname(mail_path), stop_dir)
+                    _logger.info("%sremoved duplicate mail (%s).", folder_info, mail_path)
+                    return RelayoutResult.DUPLICATE
+
+            self._rename(mail_path, new_mail_path)
+            self._add_move(mail_path, new_mail_path)
+            self._remove_empty_dirs(os.path.dirname(mail_path), stop_dir)
+
+        _mail_logger.debug("%smoved mail (%s => %s).", folder_info, mail_path, new_mail_path)
+        return RelayoutResult.MOVED
+
+    def _add_move(self, mail_path, new_mail_path):
+        with self._moves_lock:
+            self._moves[mail_path] = new_mail_path
+
+    @classmethod
+    def _rename(cls, mail_path, new_mail_path, retries=3):
+        while True:
+            os.makedirs(os.path.dirname(new_mail_path), exist_ok=True)
+            try:
+                os.rename(mail_path, new_mail_path)
+                return
+            except FileNotFoundError:
+                if retries <= 0 or not os.path.isfile(mail_path):
+                    raise
+                retries -= 1  # the new (empty) directory was just cleaned up by another worker
+
+    @classmethod
+    def _remove_empty_dirs(cls, dir_path, stop_dir):
+        """Removes empty directories up to (excluding) `stop_dir`."""
+        while dir_path.startswith(stop_dir + os.sep):
+            try:
+                os.rmdir(dir_path)
+            except OSError:
+                break  # not empty
+            dir_path = os.path.dirname(dir_path)
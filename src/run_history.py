@@ -0,0 +1,56 @@
+from typing import Dict, Optional
+
+from src.json_file import JsonFile
+
+
+class FolderHistory:
+
+    def __init__(self):
+        self.uid_validity: Optional[int] = None
+        self.uid_next: Optional[int] = None
+        self.resume_uid: Optional[int] = None  # checkpoint of an incomplete run: all UIDs up to this were processed
+        self.seconds = 0.0  # of the last (partial) run
+        self.mails = 0
+        self.bytes = 0
+        self.last_run: Optional[str] = None
+
+    def __str__(self):
+        return '{} mails, {} bytes, {:.1f}s, resume: {}'.format(self.mails, self.bytes, self.seconds, self.resume_uid)
+
+    def __repr__(self) -> str:
+        return '{}({})'.format(self.__class__.__name__, str(self))
+
+    def to_dict(self) -> Dict[str, any]:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]):
+        instance = FolderHistory()
+        for key, value in data.items():
+            if hasattr(instance, key):
+                setattr(instance, key, value)
+        return instance
+
+
+class RunHistory:
+    """Per folder statistics and checkpoints of former runs. Persisted as JSON file."""
+
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._folders: Dict[str, FolderHistory] = {}
+
+    def load(self):
+        data = JsonFile.load(self._file_path, "run history")
+        if data is None:
+            return
+
+        self._folders = {name: FolderHistory.from_dict(value) for name, value in data.items()}
+
+    def save(self):
+        JsonFile.save(self._file_path, {name: value.to_dict() for name, value in self._folders.items()}, indent=2)
+
+    def get(self, folder_name) -> Optional[FolderHistory]:
+        return self._folders.get(folder_name)
+
+    def set(self, folder_name, folder_history: FolderHistory):
+        self._folders[folder_name] = folder_history
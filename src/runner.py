@@ -3,19 +3,32 @@ import datetime
 import imaplib
 import logging
 import os
+import re
+import shutil
 import signal
 import socket
+import time
+from concurrent.futures.process import BrokenProcessPool
 from enum import Enum
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from imap_tools import MailBox, OR
+from imap_tools import AND, MailBox, OR, U
 
 from src.config import Config, ConfigKey
+from src.folder_scheduler import FolderScheduler
+from src.log_filter import DebugLogFilter
+from src.mail_decoder import MailDecoder
 from src.mail_message_ext import MailMessageExt
 from src.message_exception import MessageException
+from src.message_index import MessageIndex
+from src.profiler import Profiler
 from src.naming_utils import NamingUtils
+from src.path_sharding import PathSharding
+from src.run_history import FolderHistory, RunHistory
+from src.s3_mirror import S3Mirror
 
 _logger = logging.getLogger(__name__)
+_mail_logger = DebugLogFilter.get_mail_logger(__name__)
 
 
 class ExistsMethod(Enum):
@@ -32,8 +45,10 @@ class ExistsMethod(Enum):
 
 class FolderConfigKey(Enum):
     PATH = "path"
+    FORMER_PATH = "former_path"
     FILE_PATTERN = "file_pattern"
     LAST_DAYS = "last_days"
+    SHARD_MAX_FILES = "shard_max_files"
     WHEN_EXISTS = "when_exists"
 
     @classmethod
@@ -54,8 +69,10 @@ class FolderConfig:
     def __init__(self, name):
         self.name = name
         self.path = ""
+        self.former_path: Optional[str] = None  # path pattern before a change, used by relayout
         self.file_pattern = ""
         self.last_days: Optional[int] = None  # "None" means all messages
+        self.shard_max_files: Optional[int] = None  # "None" means no sharding (sub directories)
         self.exists_method = ExistsMethod.COMPARE
 
     def __str__(self):
@@ -70,12 +87,20 @@ class Runner:
     DEFAULT_EXIST_METHODE = ExistsMethod.COMPARE
     DEFAULT_FILE_PATTERN = "./downloads/{YEAR}-{MONTH}/{YEAR}{MONTH}{DAY}-{HOUR}{MINUTE}-{UID}-{SUBJECT}.eml"
 
+    FETCH_UID_CHUNK_SIZE = 200
+
+    # server side object ids by IMAP capability
+    SERVER_ID_ITEMS = [("OBJECTID", "EMAILID"), ("X-GM-EXT-1", "X-GM-MSGID")]
+
     def __init__(self, config):
         self._config = config
         self._shutdown = False
         self._count_found = 0
         self._count_saved = 0
         self._count_skipped = 0
+        self._count_copied = 0
+        self._count_bytes = 0
+        self._progress_uid: Optional[int] = None  # all UIDs up to this were processed in the current folder
 
         signal.signal(signal.SIGINT, self._shutdown_gracefully)
         signal.signal(signal.SIGTERM, self._shutdown_gracefully)
@@ -83,6 +108,8 @@ class Runner:
         if _logger.isEnabledFor(logging.DEBUG):
             cloned_config = copy.deepcopy(self._config)
             cloned_config[ConfigKey.IMAP_PASSWORD.value] = "***"
+            if ConfigKey.S3_SECRET_KEY.value in cloned_config:
+                cloned_config[ConfigKey.S3_SECRET_KEY.value] = "***"
             _logger.debug("config = %s", cloned_config)
 
         self._folder_configs = self.parse_folder_configs(self._config)
@@ -93,12 +120,51 @@ class Runner:
         self._host_info = "{}:{}".format(self._host, self._port) if self._port else self._host
 
         self._pivot_path = config[ConfigKey.PIVOT_PATH.value]
+        self._path_sharding = PathSharding()
+
+        self._message_index: Optional[MessageIndex] = None
+        message_index_path = Config.get_str(self._config, ConfigKey.MESSAGE_INDEX)
+        if message_index_path:
+            self._message_index = MessageIndex(NamingUtils.join_path(self._pivot_path, message_index_path))
+        self._server_id_item: Optional[str] = None
+
+        self._run_history: Optional[RunHistory] = None
+        run_history_path = Config.get_str(self._config, ConfigKey.RUN_HISTORY)
+        if run_history_path:
+            self._run_history = RunHistory(NamingUtils.join_path(self._pivot_path, run_history_path))
+
+        self._s3_mirror: Optional[S3Mirror] = None
+        if Config.get_str(self._config, ConfigKey.S3_BUCKET):
+            self._s3_mirror = S3Mirror(self._config, self._pivot_path)
+
+        self._profiler: Optional[Profiler] = None
+        profile_dir = Config.get_str(self._config, ConfigKey.PROFILE)
+        if profile_dir:
+            self._profiler = Profiler(profile_dir)
+
+        self._mail_decoder: Optional[MailDecoder] = None
+        decode_workers = Config.get_int(self._config, ConfigKey.DECODE_WORKERS, 0)
+        if decode_workers > 0 and self._profiler is not None:
+            _logger.info("profiling: decoding in process (decode_workers ignored).")
+        elif decode_workers > 0:
+            self._mail_decoder = MailDecoder(decode_workers)
+
+        self._max_runtime = Config.get_int(self._config, ConfigKey.MAX_RUNTIME)  # seconds
+        self._deadline: Optional[float] = None
 
     def _shutdown_gracefully(self, sig, _frame):
         _logger.info("shutdown signaled (%s)", sig)
         self._shutdown = True
 
+    def _check_runtime(self):
+        if self._deadline is not None and not self._shutdown and time.monotonic() >= self._deadline:
+            _logger.info("max runtime (%ss) exceeded, stopping.", self._max_runtime)
+            self._shutdown = True
+
     def run(self):
+        if self._max_runtime and self._max_runtime > 0:
+            self._deadline = time.monotonic() + self._max_runtime
+
         try:
             self._connect()
         except socket.gaierror as ex:
@@ -106,6 +172,17 @@ class Runner:
             raise MessageException(message)
         except imaplib.IMAP4.error as ex:
             raise MessageException(str(ex))
+        finally:
+            if self._mail_decoder is not None:
+                self._mail_decoder.close()
+            if self._profiler is not None:
+                self._profiler.close()
+            if self._s3_mirror is not None:
+                self._s3_mirror.close()
+            if self._message_index is not None:
+                self._message_index.save()
+            if self._run_history is not None:
+                self._run_history.save()
 
     def _connect(self):
         username = Config.get_str(self._config, ConfigKey.IMAP_USERNAME)
@@ -119,48 +196,247 @@ class Runner:
         if self._port:
             kwargs["port"] = self._port
 
+        if self._message_index is not None:
+            self._message_index.load()
+        if self._run_history is not None:
+            self._run_history.load()
+        if self._s3_mirror is not None:
+            self._s3_mirror.load()
+
         with MailBox(**kwargs).login(username, password) as mailbox:
             _logger.info("logged in (%s@%s)", username, self._host_info)
 
+            if self._message_index is not None:
+                self._server_id_item = self.find_server_id_item(mailbox)
+
             folders = mailbox.folder.list()
             folders_names = [f.name for f in folders]
             _logger.info("found mail folders = %s", folders_names)
 
+            folder_configs = []
             for folder_config in self._folder_configs:
-                if self._shutdown:
-                    break
-
                 if folder_config.name not in folders_names:
                     _logger.warning("folder name (%s) not found, skipping!", folder_config.name)
-                    continue
+                else:
+                    folder_configs.append(folder_config)
 
-                mailbox.folder.set(folder_config.name)
+            statuses = {}
+            if self._deadline is not None or self._run_history is not None:
+                statuses = {fc.name: mailbox.folder.status(fc.name) for fc in folder_configs}
+            if self._deadline is not None:
+                folder_configs = FolderScheduler.schedule(folder_configs, statuses, self._run_history)
+                _logger.info("scheduled folders = %s", [fc.name for fc in folder_configs])
+
+            for folder_config in folder_configs:
+                self._check_runtime()
+                if self._shutdown:
+                    break
 
-                query_args = []
-                if folder_config.last_days and folder_config.last_days > 0:
-                    since = datetime.date.today() - datetime.timedelta(days=folder_config.last_days)
-                    query_args = [OR(date_gte=since)]
+                mailbox.folder.set(folder_config.name)
 
                 try:
-                    for mail in mailbox.fetch(*query_args, mark_seen=False):
-                        self.handle_mail(mail, folder_config)
-                        if self._shutdown:
-                            break
+                    self._backup_folder(mailbox, folder_config, statuses.get(folder_config.name))
                 except Exception as ex:
                     _logger.error("error in folder: %s", folder_config.name)
                     raise ex
 
-        _logger.info("success: %s mails saved (of %s found; %s skipped for legal reasons, e.g. already exists).",
-                     self._count_saved, self._count_found, self._count_skipped)
+        _logger.info("success: %s mails saved (of %s found; %s copied locally; %s skipped for legal reasons, "
+                     "e.g. already exists).", self._count_saved, self._count_found, self._count_copied, self._count_skipped)
+
+    def _backup_folder(self, mailbox: MailBox, folder_config: FolderConfig, status: Optional[Dict[str, int]]):
+        """
+        Backups the selected folder. If a former run was stopped (e.g. by max runtime), the folder is resumed
+        after the last processed UID; the checkpoint is stored in the run history.
+        """
+        history = self._run_history.get(folder_config.name) if self._run_history is not None else None
+        resume_uid = FolderScheduler.get_resume_uid(status, history) if status else None
+
+        criteria = []
+        if folder_config.last_days and folder_config.last_days > 0:
+            since = datetime.date.today() - datetime.timedelta(days=folder_config.last_days)
+            criteria.append(OR(date_gte=since))
+        if resume_uid is not None:
+            _logger.info("folder '%s' - resume after UID %s.", folder_config.name, resume_uid)
+            criteria.append(AND(uid=U(resume_uid + 1, "*")))
+        query_args = [AND(*criteria)] if len(criteria) > 1 else criteria
+
+        start_time = time.monotonic()
+        start_found = self._count_found
+        start_bytes = self._count_bytes
+        self._progress_uid = resume_uid
+
+        if self._profiler is not None:
+            self._profiler.start_folder(folder_config.name)
+        try:
+            if self._message_index is None:
+                mails = (m for m in mailbox.fetch(*query_args, mark_seen=False) if not self.is_processed(m, resume_uid))
+                for mail, attributes in self._decode(mails):
+                    self._process_mail(mail, folder_config, attributes=attributes)
+                    self._progress_uid = int(mail.uid)
+                    self._check_runtime()
+                    if self._shutdown:
+                        break
+            else:
+                self._backup_folder_indexed(mailbox, folder_config, query_args, resume_uid)
+        finally:
+            if self._profiler is not None:
+                self._profiler.stop_folder()
+
+        if self._run_history is not None and status:
+            folder_history = FolderHistory()
+            folder_history.uid_validity = status.get("UIDVALIDITY")
+            folder_history.uid_next = status.get("UIDNEXT")
+            folder_history.resume_uid = self._progress_uid if self._shutdown else None
+            folder_history.seconds = time.monotonic() - start_time
+            folder_history.mails = self._count_found - start_found
+            folder_history.bytes = self._count_bytes - start_bytes
+            folder_history.last_run = datetime.datetime.now().isoformat(timespec="seconds")
+            self._run_history.set(folder_config.name, folder_history)
+
+    @classmethod
+    def is_processed(cls, mail, resume_uid: Optional[int]) -> bool:
+        # "UID n:*" returns the last mail even if n is greater than all UIDs
+        return resume_uid is not None and int(mail.uid) <= resume_uid
+
+    def _backup_folder_indexed(self, mailbox: MailBox, folder_config: FolderConfig, query_args, resume_uid: Optional[int]):
+        """
+        Fetches only the headers first. Mails already known by the message index (e.g. moved between folders)
+        are copied locally, only the remaining mails get downloaded completely.
+        """
+        server_ids = self.fetch_server_ids(mailbox, self._server_id_item)
+
+        fetch_uids = []
+        last_uid = resume_uid
+        for mail in mailbox.fetch(*query_args, mark_seen=False, headers_only=True):
+            if self.is_processed(mail, resume_uid):
+                continue
+            index_keys = MessageIndex.get_keys(mail, server_ids.get(mail.uid))
+            source_path = self._message_index.find(index_keys, mail.size_rfc822)
+            if source_path:
+                self._process_mail(mail, folder_config, source_path=source_path, index_keys=index_keys)
+            else:
+                fetch_uids.append(mail.uid)
+            last_uid = int(mail.uid)
+            self._check_runtime()
+            if self._shutdown:
+                self._progress_uid = int(fetch_uids[0]) - 1 if fetch_uids else last_uid
+                return
+
+        _logger.debug("folder '%s' - %s mails to download.", folder_config.name, len(fetch_uids))
+
+        for pos in range(0, len(fetch_uids), self.FETCH_UID_CHUNK_SIZE):
+            uids = fetch_uids[pos:pos + self.FETCH_UID_CHUNK_SIZE]
+            for mail, attributes in self._decode(mailbox.fetch(AND(uid=uids), mark_seen=False)):
+                index_keys = MessageIndex.get_keys(mail, server_ids.get(mail.uid))
+                self._process_mail(mail, folder_config, index_keys=index_keys, attributes=attributes)
+                self._progress_uid = int(mail.uid)
+                self._check_runtime()
+                if self._shutdown:
+                    return
+            if self._shutdown:
+                return  # decoding stopped early (BrokenProcessPool)
+
+    def _decode(self, mails: Iterable[MailMessageExt]) -> Iterator[Tuple[MailMessageExt, Optional[Dict[str, any]]]]:
+        """:return: (mail, naming attributes or None if not decoded in advance)"""
+        if self._mail_decoder is None:
+            for mail in mails:
+                yield mail, None
+        else:
+            try:
+                yield from self._mail_decoder.decode(mails)
+            except BrokenProcessPool:
+                if not self._shutdown:
+                    raise
+                _logger.info("decoder processes terminated, stop at UID %s.", self._progress_uid)
+
+    @classmethod
+    def find_server_id_item(cls, mailbox: MailBox) -> Optional[str]:
+        """
+        :return: IMAP fetch item for server side object ids (e.g. "EMAILID") or None if not supported
+        """
+        _, data = mailbox.client.capability()
+        capabilities = data[0].decode().upper().split() if data and data[0] else []
+        for capability, item in cls.SERVER_ID_ITEMS:
+            if capability in capabilities:
+                _logger.debug("use server side message ids (%s).", item)
+                return item
+        return None
+
+    @classmethod
+    def fetch_server_ids(cls, mailbox: MailBox, item: Optional[str]) -> Dict[str, str]:
+        """
+        :return: UID => index key (e.g. "EMAILID:M6d99ac3275bb4e") for all mails of the selected folder
+        """
+        if not item:
+            return {}
+
+        try:
+            _, data = mailbox.client.uid("fetch", "1:*", "({})".format(item))
+        except imaplib.IMAP4.error as ex:
+            _logger.warning("cannot fetch server side message ids (%s): %s", item, ex)
+            return {}
+
+        return cls.parse_server_ids(data, item)
 
-    def handle_mail(self, mail: MailMessageExt, folder_config: FolderConfig):
-        attributes = NamingUtils.extract_attributes(mail)
+    @classmethod
+    def parse_server_ids(cls, data, item: str) -> Dict[str, str]:
+        regex_uid = re.compile(r"\bUID (\d+)")
+        regex_id = re.compile(r"\b{} \(?([^ ()]+)\)?".format(re.escape(item)))
+
+        server_ids = {}
+        for line in data or []:
+            if isinstance(line, tuple):
+                line = line[0]
+            if not isinstance(line, bytes):
+                continue
+            text = line.decode(errors="replace")
+            match_uid = regex_uid.search(text)
+            match_id = regex_id.search(text)
+            if match_uid and match_id:
+                server_ids[match_uid.group(1)] = "{}:{}".format(item, match_id.group(1))
+        return server_ids
+
+    def _process_mail(self, mail: MailMessageExt, folder_config: FolderConfig, **kwargs):
+        if self._profiler is None:
+            self.handle_mail(mail, folder_config, **kwargs)
+            return
+
+        bucket = Profiler.get_mail_bucket(mail)
+        snapshot = self._profiler.before_mail(bucket)
+        self.handle_mail(mail, folder_config, **kwargs)
+        self._profiler.sample_mail(mail, bucket, snapshot)
+
+    def handle_mail(self, mail: MailMessageExt, folder_config: FolderConfig,
+                    source_path: Optional[str] = None, index_keys: Optional[List[str]] = None,
+                    attributes: Optional[Dict[str, any]] = None):
+        """
+        :param mail:
+        :param folder_config:
+        :param source_path: locally stored file of the same mail (copied instead of downloaded); `mail` contains headers only
+        :param index_keys: keys to register the stored file in the message index
+        :param attributes: naming attributes, if already extracted (MailDecoder)
+        """
+        if attributes is None:
+            attributes = NamingUtils.extract_attributes(mail)
         mail_path = NamingUtils.format_path(folder_config.path, attributes)
-        mail_path = os.path.realpath(NamingUtils.join_path(self._pivot_path, mail_path))
+        formatted_path = os.path.realpath(NamingUtils.join_path(self._pivot_path, mail_path))
+        mail_path = self._path_sharding.resolve(formatted_path, folder_config.shard_max_files)
         folder_info = "folder '{}' - ".format(folder_config.name)
 
         self._count_found += 1
+        self._count_bytes += len(mail.raw_data)
 
+        if source_path:
+            if source_path == mail_path:
+                _mail_logger.debug("%sskip indexed mail (%s).", folder_info, mail_path)
+                self._count_skipped += 1
+                self._mirror_mail(mail_path)
+                return
+            with open(source_path, "rb") as file:
+                mail.raw_data = file.read()
+
+        stored_path = None  # verified to contain the mail
+        mirror_path = None
         mail_exists = os.path.isfile(mail_path)
         do_write = not mail_exists
 
@@ -170,10 +446,16 @@ class Runner:
                 _logger.info("%sremove former mail (%s).", folder_info, mail_path)
                 do_write = True
             elif folder_config.exists_method == ExistsMethod.SKIP:
-                _logger.debug("%sskip existing file (%s).", folder_info, mail_path)
+                _mail_logger.debug("%sskip existing file (%s).", folder_info, mail_path)
                 self._count_skipped += 1
+                mirror_path = mail_path
+                if index_keys and os.path.getsize(mail_path) == len(mail.raw_data):
+                    stored_path = mail_path  # register, so the next run finds it without re-downloading
             else:  # folder_config.exists_method == ExistsMethod.COMPARE:
-                new_mail_path = self.find_existing_file_or_new_mail_path(mail, mail_path, folder_config)
+                new_mail_path, stored_path = self.find_identical_file_or_new_mail_path(
+                    mail, formatted_path, folder_config,
+                    lambda p: self._path_sharding.resolve(p, folder_config.shard_max_files)
+                )
                 if new_mail_path:
                     mail_path = new_mail_path
                     do_write = True
@@ -181,12 +463,34 @@ class Runner:
                     self._count_skipped += 1
 
         if do_write:
-            _logger.debug("%sbackup mail (%s).", folder_info, mail_path)
+            _mail_logger.debug("%sbackup mail (%s).", folder_info, mail_path)
             mail_dir = os.path.dirname(mail_path)
             os.makedirs(mail_dir, exist_ok=True)
-            with open(mail_path, "wb") as file:
-                file.write(mail.raw_data)
+            if source_path:
+                self.copy_mail_file(source_path, mail_path)
+                self._count_copied += 1
+            else:
+                with open(mail_path, "wb") as file:
+                    file.write(mail.raw_data)
             self._count_saved += 1
+            stored_path = mail_path
+
+        if stored_path and index_keys and self._message_index is not None:
+            self._message_index.add(index_keys, stored_path)
+
+        self._mirror_mail(stored_path or mirror_path)
+
+    def _mirror_mail(self, mail_path: Optional[str]):
+        if mail_path and self._s3_mirror is not None:
+            self._s3_mirror.submit(mail_path)
+
+    @classmethod
+    def copy_mail_file(cls, source_path, mail_path):
+        """Hardlinks an already stored mail file, falls back to copying (e.g. across file systems)."""
+        try:
+            os.link(source_path, mail_path)
+        except OSError:
+            shutil.copyfile(source_path, mail_path)
 
     @classmethod
     def find_existing_file_or_new_mail_path(cls, mail, orig_mail_path, folder_config: FolderConfig = None) -> Optional[str]:
@@ -196,8 +500,27 @@ class Runner:
         :param Optional[FolderConfig] folder_config: only for logging folder info
         :return: new path to write or None when should not be written
         """
-        if not os.path.isfile(orig_mail_path):
-            return orig_mail_path
+        new_mail_path, _ = cls.find_identical_file_or_new_mail_path(mail, orig_mail_path, folder_config)
+        return new_mail_path
+
+    @classmethod
+    def find_identical_file_or_new_mail_path(cls, mail, orig_mail_path, folder_config: FolderConfig = None,
+                                             resolve_path: Optional[Callable[[str], str]] = None) \
+            -> Tuple[Optional[str], Optional[str]]:
+        """
+        :param MailMessageExt mail:
+        :param str orig_mail_path:
+        :param Optional[FolderConfig] folder_config: only for logging folder info
+        :param resolve_path: maps the original and each postfixed path to an existing or a new file (PathSharding)
+        :return: (new path to write or None when should not be written, path of an identical existing file or None)
+        """
+        if resolve_path is None:
+            def resolve_path(path):
+                return path
+
+        new_mail_path = resolve_path(orig_mail_path)
+        if not os.path.isfile(new_mail_path):
+            return new_mail_path, None
 
         folder_info = ""
         if folder_config:
@@ -206,31 +529,29 @@ class Runner:
         loop = 0
 
         while loop < 5:
-            if loop == 0:
-                new_mail_path = orig_mail_path
-            else:
+            if loop > 0:
                 file_path, file_extension = os.path.splitext(orig_mail_path)
-                new_mail_path = file_path + "." + str(loop + 1) + file_extension
+                new_mail_path = resolve_path(file_path + "." + str(loop + 1) + file_extension)
 
             if not os.path.isfile(new_mail_path):
-                return new_mail_path
+                return new_mail_path, None
 
             with open(new_mail_path, "rb") as file:
                 compare_data = bytearray(file.read())
 
             if compare_data == mail.raw_data:
-                if orig_mail_path == new_mail_path:
-                    _logger.debug("%sskip existing mail (%s).", folder_info, orig_mail_path)
+                if loop == 0:
+                    _mail_logger.debug("%sskip existing mail (%s).", folder_info, orig_mail_path)
                 else:
-                    _logger.debug("%sskip existing mail (expected: %s, found as: %s).",
-                                  folder_info, orig_mail_path, new_mail_path)
-                return None
+                    _mail_logger.debug("%sskip existing mail (expected: %s, found as: %s).",
+                                       folder_info, orig_mail_path, new_mail_path)
+                return None, new_mail_path
 
             loop += 1
 
         _logger.warning("cannot find other path for existing mail (%s). loop (%s) exceeded!", orig_mail_path, loop)
 
-        return None
+        return None, None
 
     @classmethod
     def parse_folder_configs(cls, config):
@@ -258,6 +579,7 @@ class Runner:
             if not folder_config.path:
                 raise MessageException("invalid folder configuration (no empty folder path)!")
 
+            folder_config.former_path = config.get(FolderConfigKey.FORMER_PATH.value)
             folder_config.file_pattern = config.get(FolderConfigKey.FILE_PATTERN.value, cls.DEFAULT_FILE_PATTERN)
             folder_config.exists_method = FolderConfigKey.parse(
                 config.get(FolderConfigKey.WHEN_EXISTS.value),
@@ -270,6 +592,12 @@ class Runner:
             elif last_days:
                 folder_config.last_days = int(last_days, 0)
 
+            shard_max_files = config.get(FolderConfigKey.SHARD_MAX_FILES.value)
+            if isinstance(shard_max_files, int):
+                folder_config.shard_max_files = shard_max_files
+            elif shard_max_files:
+                folder_config.shard_max_files = int(shard_max_files, 0)
+
             folder_configs.append(folder_config)
 
         return folder_configs
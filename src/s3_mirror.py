@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from src.config import Config, ConfigKey
+from src.constant import Constant
+from src.json_file import JsonFile
+from src.log_filter import DebugLogFilter
+from src.message_exception import MessageException
+from src.naming_utils import NamingUtils
+
+_logger = logging.getLogger(__name__)
+_mail_logger = DebugLogFilter.get_mail_logger(__name__)
+
+
+class S3Mirror:
+    """
+    Mirrors stored mail files to an S3-compatible object store (e.g. MinIO). Uploads run concurrently in a thread pool,
+    big files as multipart uploads. Uploaded files are tracked in a local manifest, so no LIST calls are needed.
+    """
+
+    MULTIPART_CONCURRENCY = 4  # parts per file
+    PENDING_PER_WORKER = 4  # limits queued uploads (and so memory)
+
+    def __init__(self, config, pivot_path):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config as BotoConfig
+        except ImportError:
+            raise MessageException("S3 mirror requires package 'boto3' (pip install boto3)!")
+
+        self._pivot_path = os.path.realpath(pivot_path)
+        self._bucket = Config.get_str(config, ConfigKey.S3_BUCKET)
+        self._prefix = Config.get_str(config, ConfigKey.S3_PREFIX, "")
+        workers = Config.get_int(config, ConfigKey.S3_WORKERS, Constant.DEFAULT_S3_WORKERS)
+        multipart_threshold = Config.get_int(config, ConfigKey.S3_MULTIPART_THRESHOLD, Constant.DEFAULT_S3_MULTIPART_THRESHOLD)
+
+        manifest_path = Config.get_str(config, ConfigKey.S3_MANIFEST, Constant.DEFAULT_S3_MANIFEST)
+        self._manifest_path = NamingUtils.join_path(pivot_path, manifest_path)
+
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=Config.get_str(config, ConfigKey.S3_ENDPOINT),
+            region_name=Config.get_str(config, ConfigKey.S3_REGION),
+            aws_access_key_id=Config.get_str(config, ConfigKey.S3_ACCESS_KEY),
+            aws_secret_access_key=Config.get_str(config, ConfigKey.S3_SECRET_KEY),
+            config=BotoConfig(max_pool_connections=workers * self.MULTIPART_CONCURRENCY),
+        )
+        self._transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_threshold,
+            max_concurrency=self.MULTIPART_CONCURRENCY,
+        )
+
+        self._lock = threading.Lock()
+        self._manifest: Dict[str, List[int]] = {}  # key => [size, mtime_ns]
+        self._manifest_changed = False
+        self._pending = threading.BoundedSemaphore(workers * self.PENDING_PER_WORKER)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3")
+        self._count_uploaded = 0
+        self._count_moved = 0
+        self._count_failed = 0
+
+    def load(self):
+        manifest = JsonFile.load(self._manifest_path, "S3 manifest")
+        if manifest is not None:
+            self._manifest = manifest
+        _logger.debug("S3 manifest loaded (%s entries).", len(self._manifest))
+
+    def close(self):
+        """Waits for pending uploads and saves the manifest."""
+        self._executor.shutdown(wait=True)
+        self._save_manifest()
+        _logger.info("S3 mirror: %s files uploaded, %s moved, %s failed.",
+                     self._count_uploaded, self._count_moved, self._count_failed)
+
+    def _save_manifest(self):
+        if not self._manifest_changed:
+            return
+
+        JsonFile.save(self._manifest_path, self._manifest)
+        self._manifest_changed = False
+
+    def get_key(self, mail_path) -> str:
+        mail_path = os.path.realpath(mail_path)
+        if mail_path.startswith(self._pivot_path + os.sep):
+            rel_path = os.path.relpath(mail_path, self._pivot_path)
+        else:
+            rel_path = mail_path.lstrip(os.sep)
+        return self._prefix + rel_path.replace(os.sep, "/")
+
+    def submit(self, mail_path):
+        """Queues the upload of a stored mail file, unless it was uploaded unchanged before."""
+        stat = os.stat(mail_path)
+        key = self.get_key(mail_path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+
+        with self._lock:
+            if self._manifest.get(key) == signature:
+                return
+
+        self._pending.acquire()  # blocks while too many uploads are queued
+        future = self._executor.submit(self._upload, mail_path, key, signature)
+        future.add_done_callback(lambda _: self._pending.release())
+
+    def move(self, old_path, new_path):
+        """
+        Follows a local move (relayout): the object is copied server side and the old one deleted. If `new_path` is
+        an identical file which is already uploaded (removed duplicate), only the old object is deleted.
+        """
+        old_key = self.get_key(old_path)
+        new_key = self.get_key(new_path)
+        with self._lock:
+            if old_key == new_key or old_key not in self._manifest:
+                return  # not uploaded yet, the new file gets uploaded by the next backup run
+
+        stat = os.stat(new_path)
+        self._pending.acquire()
+        future = self._executor.submit(self._move, old_key, new_key, [stat.st_size, stat.st_mtime_ns])
+        future.add_done_callback(lambda _: self._pending.release())
+
+    def _move(self, old_key, new_key, signature):
+        try:
+            with self._lock:
+                copy = new_key not in self._manifest
+            if copy:
+                copy_source = {"Bucket": self._bucket, "Key": old_key}
+                self._client.copy(copy_source, self._bucket, new_key, Config=self._transfer_config)
+            self._client.delete_object(Bucket=self._bucket, Key=old_key)
+        except Exception as ex:
+            _logger.error("cannot move S3 object (%s => %s): %s", old_key, new_key, ex)
+            with self._lock:
+                self._count_failed += 1
+            return
+
+        _mail_logger.debug("moved S3 object (%s => %s).", old_key, new_key)
+        with self._lock:
+            del self._manifest[old_key]
+            if copy:
+                self._manifest[new_key] = signature
+            self._manifest_changed = True
+            self._count_moved += 1
+
+    def _upload(self, mail_path, key, signature):
+        try:
+            self._client.upload_file(mail_path, self._bucket, key, Config=self._transfer_config)
+        except Exception as ex:
+            _logger.error("cannot upload mail (%s) to S3: %s", mail_path, ex)
+            with self._lock:
+                self._count_failed += 1
+            return
+
+        _mail_logger.debug("uploaded mail (%s) to S3 (%s).", mail_path, key)
+        with self._lock:
+            self._manifest[key] = signature
+            self._manifest_changed = True
+            self._count_uploaded += 1
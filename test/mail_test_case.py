@@ -0,0 +1,47 @@
+import os
+import shutil
+import unittest
+from datetime import datetime
+
+from src.config import ConfigKey
+from src.runner import Runner
+
+
+class DummyMail:
+
+    def __init__(self, raw_data=b"", uid=123):
+        self.uid = uid
+        self.date = datetime(2020, 9, 10, 18, 7, 6)
+        self.subject = "subject"
+        self.to = ("to@dummy.de", )
+        self.from_ = "from@dummy.de"
+        self.raw_data = raw_data
+        self.size_rfc822 = 0  # unknown
+
+
+class MailTestCase(unittest.TestCase):
+    """Provides an empty directory per test (`test_path`)."""
+
+    TEST_DIR = None  # sub directory of "__test__"
+
+    def setUp(self):
+        self.test_path = os.path.realpath(os.path.join(os.path.dirname(__file__), "../__test__", self.TEST_DIR))
+        shutil.rmtree(self.test_path, ignore_errors=True)
+        os.makedirs(self.test_path, exist_ok=True)
+
+    def write_file(self, rel_path, data=b"mail"):
+        file_path = os.path.join(self.test_path, rel_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as file:
+            file.write(data)
+        return file_path
+
+    def create_runner(self, folder_path, **config):
+        """:return: (runner, folder config)"""
+        config = {
+            ConfigKey.PIVOT_PATH.value: self.test_path,
+            ConfigKey.IMAP_FOLDERS.value: [{"folder_name": "Archive", "path": folder_path}],
+            **config,
+        }
+        runner = Runner(config)
+        return runner, runner.parse_folder_configs(config)[0]
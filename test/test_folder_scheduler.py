@@ -0,0 +1,65 @@
+import unittest
+
+from src.folder_scheduler import FolderScheduler
+from src.run_history import FolderHistory, RunHistory
+from src.runner import FolderConfig
+
+
+class TestFolderScheduler(unittest.TestCase):
+
+    @classmethod
+    def create_history(cls, uid_validity, uid_next, mails, seconds, resume_uid=None, bytes_=0):
+        history = FolderHistory()
+        history.uid_validity = uid_validity
+        history.uid_next = uid_next
+        history.mails = mails
+        history.seconds = seconds
+        history.bytes = bytes_
+        history.resume_uid = resume_uid
+        return history
+
+    def test_get_resume_uid(self):
+        history = self.create_history(1, 100, 10, 1.0, resume_uid=50)
+        self.assertEqual(FolderScheduler.get_resume_uid({"UIDVALIDITY": 1}, history), 50)
+        self.assertIsNone(FolderScheduler.get_resume_uid({"UIDVALIDITY": 2}, history))
+        self.assertIsNone(FolderScheduler.get_resume_uid({"UIDVALIDITY": 1}, None))
+
+    def test_estimate_mails(self):
+        status = {"MESSAGES": 80, "UIDNEXT": 120, "UIDVALIDITY": 1}
+
+        self.assertEqual(FolderScheduler.estimate_mails(status, None, None), 80)
+
+        history = self.create_history(1, 100, 10, 1.0, resume_uid=109)
+        self.assertEqual(FolderScheduler.estimate_mails(status, history, None), 10)
+
+        history = self.create_history(1, 100, 10, 1.0)
+        self.assertEqual(FolderScheduler.estimate_mails(status, history, 7), 30)  # 10 former + 20 new
+
+    def test_schedule(self):
+        folder_configs = [FolderConfig("big"), FolderConfig("slow"), FolderConfig("small"), FolderConfig("unknown")]
+        statuses = {
+            "big": {"MESSAGES": 10000, "UIDNEXT": 10001, "UIDVALIDITY": 1},
+            "slow": {"MESSAGES": 100, "UIDNEXT": 101, "UIDVALIDITY": 1},
+            "small": {"MESSAGES": 100, "UIDNEXT": 101, "UIDVALIDITY": 1},
+            "unknown": {"MESSAGES": 50, "UIDNEXT": 51, "UIDVALIDITY": 1},
+        }
+        run_history = RunHistory("unused")
+        run_history.set("slow", self.create_history(1, 101, 100, 100.0))  # 1s per mail
+        run_history.set("small", self.create_history(1, 101, 100, 1.0))
+
+        result = FolderScheduler.schedule(folder_configs, statuses, run_history)
+        self.assertEqual([fc.name for fc in result], ["small", "unknown", "slow", "big"])
+
+    def test_schedule_by_bytes(self):
+        folder_configs = [FolderConfig("big_mails"), FolderConfig("unknown"), FolderConfig("small_mails")]
+        statuses = {
+            "big_mails": {"MESSAGES": 100, "UIDNEXT": 101, "UIDVALIDITY": 1},
+            "unknown": {"MESSAGES": 100, "UIDNEXT": 101, "UIDVALIDITY": 1},
+            "small_mails": {"MESSAGES": 100, "UIDNEXT": 101, "UIDVALIDITY": 1},
+        }
+        run_history = RunHistory("unused")
+        run_history.set("big_mails", self.create_history(1, 101, 100, 0.0, bytes_=100 * 1000 * 1000))  # no timing
+        run_history.set("small_mails", self.create_history(1, 101, 100, 10.0, bytes_=100 * 1000))  # 10 KB/s
+
+        result = FolderScheduler.schedule(folder_configs, statuses, run_history)
+        self.assertEqual([fc.name for fc in result], ["small_mails", "unknown", "big_mails"])
@@ -0,0 +1,42 @@
+import logging
+import unittest
+
+from src.log_filter import DebugLogFilter
+
+
+class TestDebugLogFilter(unittest.TestCase):
+
+    @classmethod
+    def create_record(cls, level=logging.DEBUG, name="test.mail"):
+        return logging.LogRecord(name, level, __file__, 0, "message %s", ("arg", ), None)
+
+    def test_sample(self):
+        log_filter = DebugLogFilter(sample=3)
+        result = [log_filter.filter(self.create_record()) for _ in range(7)]
+        self.assertEqual(result, [True, False, False, True, False, False, True])
+
+        self.assertTrue(log_filter.filter(self.create_record(logging.INFO)))
+        self.assertTrue(all(log_filter.filter(self.create_record(name="test")) for _ in range(3)))  # not per mail
+
+    def test_rate_limit(self):
+        log_filter = DebugLogFilter(rate_limit=2)
+        result = [log_filter.filter(self.create_record()) for _ in range(4)]
+        self.assertEqual(result, [True, True, False, False])
+        self.assertTrue(log_filter.filter(self.create_record(logging.WARNING)))
+
+        log_filter._window_start -= 1.0  # next window
+        record = self.create_record()
+        self.assertTrue(log_filter.filter(record))
+        self.assertEqual(record.getMessage(), "message arg [2 debug lines suppressed]")
+
+    def test_report_suppressed(self):
+        log_filter = DebugLogFilter(rate_limit=1)
+        result = [log_filter.filter(self.create_record()) for _ in range(3)]
+        self.assertEqual(result, [True, False, False])
+
+        with self.assertLogs("src.log_filter", logging.INFO) as logs:
+            log_filter.report_suppressed()
+        self.assertEqual(logs.output, ["INFO:src.log_filter:[2 debug lines suppressed]"])
+
+        with self.assertNoLogs("src.log_filter"):
+            log_filter.report_suppressed()  # reported only once
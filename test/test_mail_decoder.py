@@ -0,0 +1,47 @@
+import os
+import signal
+import unittest
+
+from src.mail_decoder import MailDecoder
+from src.mail_message_ext import MailMessageExt
+
+
+def terminate_self():
+    os.kill(os.getpid(), signal.SIGTERM)
+    return os.getpid()
+
+
+class TestMailDecoder(unittest.TestCase):
+
+    @classmethod
+    def create_mail(cls, uid, subject):
+        raw_data = "Message-ID: <{}@dummy.de>\r\nFrom: from@dummy.de\r\nTo: to@dummy.de\r\nSubject: {}\r\n" \
+                   "Date: Thu, 10 Sep 2020 18:07:06 +0000\r\n\r\nbody\r\n".format(uid, subject).encode()
+        return MailMessageExt([("{} (UID {} FLAGS ())".format(uid, uid).encode(), raw_data)])
+
+    def test_decode(self):
+        mails = [self.create_mail(uid, "Re: subject {}".format(uid)) for uid in range(1, 21)]
+
+        decoder = MailDecoder(2)
+        try:
+            results = list(decoder.decode(iter(mails)))
+        finally:
+            decoder.close()
+
+        self.assertEqual([m for m, _ in results], mails)  # fetch order
+
+        mail, attributes = results[2]
+        self.assertEqual(attributes["UID"], "3")
+        self.assertEqual(attributes["SUBJECT"], "subject.3")
+        self.assertEqual(attributes["YEAR"], "2020")
+        self.assertEqual(mail.headers, {"message-id": ("<3@dummy.de>", )})
+        self.assertNotIn("obj", mail.__dict__)  # not parsed in this process
+
+    def test_worker_ignores_sigterm(self):
+        decoder = MailDecoder(1)
+        try:
+            pid = decoder._executor.submit(terminate_self).result(timeout=10)
+            self.assertNotEqual(pid, os.getpid())
+            self.assertEqual(decoder._executor.submit(terminate_self).result(timeout=10), pid)  # still alive
+        finally:
+            decoder.close()
@@ -0,0 +1,38 @@
+import os
+
+from mail_test_case import MailTestCase
+from src.message_index import MessageIndex
+
+
+class TestMessageIndex(MailTestCase):
+
+    TEST_DIR = "message_index"
+
+    class DummyMail:
+        def __init__(self, message_id=None):
+            self.headers = {"message-id": (message_id, )} if message_id else {}
+
+    def test_get_keys(self):
+        result = MessageIndex.get_keys(self.DummyMail(" <abc@dummy.de> "), "EMAILID:M123")
+        self.assertEqual(result, ["EMAILID:M123", "message-id:<abc@dummy.de>"])
+
+        result = MessageIndex.get_keys(self.DummyMail())
+        self.assertEqual(result, [])
+
+    def test_find_and_persist(self):
+        mail_path = self.write_file("mail.eml", b"12345")
+
+        index_path = os.path.join(self.test_path, "index.json")
+        index = MessageIndex(index_path)
+        index.add(["message-id:<a>"], mail_path)
+        index.save()
+
+        index = MessageIndex(index_path)
+        index.load()
+        self.assertEqual(index.find(["EMAILID:M1", "message-id:<a>"], 5), mail_path)
+        self.assertIsNone(index.find(["message-id:<a>"], 6))  # size differs
+        self.assertIsNone(index.find(["message-id:<a>"], 0))  # size unknown
+
+        os.remove(mail_path)
+        self.assertIsNone(index.find(["message-id:<a>"], 5))
+        self.assertEqual(len(index), 0)  # outdated entry removed
@@ -91,3 +91,21 @@ class TestNamingUtils(unittest.TestCase):
 
         result = NamingUtils.join_path("/home/x/mb/", "/2020/11/x.eml")
         self.assertEqual(result, "/2020/11/x.eml")  # absolute path!
+
+    def test_pattern_to_glob(self):
+        result = NamingUtils.pattern_to_glob("./dl/{YEAR}-{MONTH}/{YEAR}{MONTH}-{UID}[x].eml")
+        self.assertEqual(result, "./dl/*-*/**-*[[]x].eml")
+
+    def test_pattern_to_regex(self):
+        regex = NamingUtils.pattern_to_regex("./dl/{YEAR}-{MONTH}/{YEAR}{MONTH}{DAY}-{SUBJECT}-{UID}.eml")
+
+        match = regex.match("./dl/2020-09/20200910-The.sub-ject-123.eml")
+        self.assertEqual(match.groupdict(), {
+            "YEAR": "2020", "MONTH": "09", "DAY": "10", "SUBJECT": "The.sub-ject", "UID": "123"
+        })
+
+        match = regex.match("./dl/2020-09/20200910-subject-123.2.eml")  # postfixed in compare mode
+        self.assertEqual(match.group("UID"), "123")
+
+        self.assertIsNone(regex.match("./dl/2020-09/20210910-subject-123.eml"))  # YEAR differs
+        self.assertIsNone(regex.match("./dl/2020-09/20200910-subject-123.txt"))
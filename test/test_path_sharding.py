@@ -0,0 +1,37 @@
+import os
+
+from mail_test_case import MailTestCase
+from src.path_sharding import PathSharding
+
+
+class TestPathSharding(MailTestCase):
+
+    TEST_DIR = "sharding"
+
+    def test_shard_path(self):
+        result = PathSharding.get_shard_path("/mb/2020-09/mail.eml")
+        self.assertRegex(result, "^/mb/2020-09/[0-9a-f]{2}/mail.eml$")
+        self.assertEqual(result, PathSharding.get_shard_path("/other/mail.eml").replace("/other", "/mb/2020-09"))
+
+        self.assertEqual(PathSharding.get_unsharded_path(result), "/mb/2020-09/mail.eml")
+        self.assertIsNone(PathSharding.get_unsharded_path("/mb/2020-09/mail.eml"))
+
+    def test_resolve(self):
+        sharding = PathSharding()
+        old_path = os.path.join(self.test_path, "a.eml")
+        self.write_file(old_path)
+
+        self.assertEqual(sharding.resolve(old_path, None), old_path)
+
+        new_path = os.path.join(self.test_path, "b.eml")
+        self.assertEqual(sharding.resolve(new_path, 2), new_path)  # 2nd file
+        self.write_file(new_path)
+
+        new_path = os.path.join(self.test_path, "c.eml")
+        result = sharding.resolve(new_path, 2)
+        self.assertEqual(result, PathSharding.get_shard_path(new_path))
+        self.write_file(result)
+
+        self.assertEqual(sharding.resolve(old_path, 2), old_path)  # written before sharding started
+        self.assertEqual(sharding.resolve(new_path, 2), result)
+        self.assertEqual(PathSharding().resolve(new_path, 2), result)  # fresh file counts
@@ -0,0 +1,50 @@
+import os
+
+from mail_test_case import DummyMail, MailTestCase
+from src.naming_utils import NamingUtils
+from src.profiler import Profiler
+
+
+class TestProfiler(MailTestCase):
+
+    TEST_DIR = "profile"
+
+    def test_get_bucket(self):
+        self.assertEqual(Profiler.get_bucket(0), "<10KB")
+        self.assertEqual(Profiler.get_bucket(10 * 1024), "<100KB")
+        self.assertEqual(Profiler.get_bucket(5 * 1024 * 1024), ">=1MB")
+
+        class HeaderMail:
+            size_rfc822 = 200 * 1024
+            raw_data = b"headers only"
+
+        self.assertEqual(Profiler.get_mail_bucket(HeaderMail()), "<1MB")
+        HeaderMail.size_rfc822 = 0  # unknown
+        self.assertEqual(Profiler.get_mail_bucket(HeaderMail()), "<10KB")
+
+    def test_folder_report(self):
+        profiler = Profiler(self.test_path)
+        try:
+            profiler.start_folder("INBOX/Sub Folder")
+            mail = DummyMail(bytearray(200 * 1024))
+            bucket = Profiler.get_mail_bucket(mail)
+            snapshot = profiler.before_mail(bucket)
+            held = NamingUtils.extract_attributes(mail), bytearray(300 * 1024)
+            profiler.sample_mail(mail, bucket, snapshot)
+            profiler.stop_folder()
+        finally:
+            profiler.close()
+
+        report_name = Profiler.get_report_name("INBOX/Sub Folder")
+        self.assertRegex(report_name, "^INBOX.Sub.Folder-[0-9a-f]{8}$")
+        self.assertNotEqual(report_name, Profiler.get_report_name("INBOX.Sub.Folder"))
+
+        self.assertTrue(os.path.isfile(os.path.join(self.test_path, report_name + ".prof")))
+        with open(os.path.join(self.test_path, report_name + ".txt"), "r") as file:
+            report = file.read()
+
+        self.assertRegex(report, r"\n +1 +[0-9.]+  extract_attributes\n")
+        self.assertIn("## <1MB: 1 mails, 204800 bytes, 1 sampled\n", report)
+        allocations = [int(line.split()[0]) for line in report.split("## <1MB")[1].split("\n##")[0].splitlines()[1:]]
+        self.assertGreaterEqual(max(allocations), len(held[1]))  # allocated while handling
+        self.assertLess(sum(allocations), len(held[1]) + len(mail.raw_data))  # the mail itself is not counted
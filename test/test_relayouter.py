@@ -0,0 +1,107 @@
+import os
+
+from mail_test_case import MailTestCase
+from src.config import ConfigKey
+from src.message_index import MessageIndex
+from src.relayouter import Relayouter
+
+
+class TestRelayouter(MailTestCase):
+
+    TEST_DIR = "relayout"
+
+    MAIL_DATA = b"From: from@dummy.de\r\nTo: to@dummy.de\r\nSubject: Re: test\r\n" \
+                b"Date: Thu, 10 Sep 2020 18:07:06 +0000\r\n\r\nbody\r\n"
+
+    def create_relayouter(self, path, former_path, **kwargs):
+        config = {
+            **kwargs,
+            ConfigKey.PIVOT_PATH.value: self.test_path,
+            ConfigKey.IMAP_FOLDERS.value: [
+                {"folder_name": "INBOX", "path": path, "former_path": former_path},
+            ],
+        }
+        return Relayouter(config)
+
+    def test_relayout(self):
+        old_file = self.write_file("old/2020-09/20200910-123-test.eml", self.MAIL_DATA)
+
+        relayouter = self.create_relayouter(
+            "./new/{YEAR}/{MONTH}{DAY}-{FROM}-{UID}.eml",
+            "./old/{YEAR}-{MONTH}/{YEAR}{MONTH}{DAY}-{UID}-{SUBJECT}.eml"
+        )
+        relayouter.run()
+
+        new_file = os.path.join(self.test_path, "new/2020/0910-from.dummy.de-123.eml")
+        self.assertTrue(os.path.isfile(new_file))
+        self.assertFalse(os.path.exists(old_file))
+        self.assertFalse(os.path.exists(os.path.dirname(old_file)))  # empty directories get removed
+
+    def test_relayout_collision(self):
+        self.write_file("old/123-a.eml", self.MAIL_DATA)
+        self.write_file("old/123-b.eml", self.MAIL_DATA)  # duplicate
+        self.write_file("old/123-c.eml", self.MAIL_DATA + b"other\r\n")
+
+        relayouter = self.create_relayouter("./new/{UID}.eml", "./old/{UID}-{SUBJECT}.eml")
+        relayouter.run()
+
+        self.assertEqual(sorted(os.listdir(os.path.join(self.test_path, "new"))), ["123.2.eml", "123.eml"])
+        self.assertEqual(os.listdir(os.path.join(self.test_path, "old")), [])
+
+    def test_relayout_postfixed_file_in_place(self):
+        # different mails, both stored under the same new name: the postfixed file must not be removed
+        self.write_file("m/a.x.de-1.eml", self.MAIL_DATA.replace(b"To: to@dummy.de", b"To: a@x.de"))
+        other_data = self.MAIL_DATA.replace(b"To: to@dummy.de", b"To: a@x.de") + b"other\r\n"
+        self.write_file("m/a.x.de-1.2.eml", other_data)
+
+        relayouter = self.create_relayouter("./m/{TO1}-{UID}.eml", "./m/{FROM}-{UID}.eml")
+        relayouter.run()
+
+        self.assertEqual(sorted(os.listdir(os.path.join(self.test_path, "m"))), ["a.x.de-1.2.eml", "a.x.de-1.eml"])
+        with open(os.path.join(self.test_path, "m/a.x.de-1.2.eml"), "rb") as file:
+            self.assertEqual(file.read(), other_data)
+
+    def test_relayout_postfix_loop_exhausted(self):
+        self.write_file("new/123.eml", b"1")
+        for postfix in range(2, 6):
+            self.write_file("new/123.{}.eml".format(postfix), str(postfix).encode())
+        old_file = self.write_file("old/123-a.eml", self.MAIL_DATA)
+
+        relayouter = self.create_relayouter("./new/{UID}.eml", "./old/{UID}-{SUBJECT}.eml")
+        relayouter.run()
+
+        self.assertTrue(os.path.isfile(old_file))  # kept, no free path
+        self.assertEqual(len(os.listdir(os.path.join(self.test_path, "new"))), 5)
+
+    def test_relayout_parallel(self):
+        for uid in range(1, 201):
+            data = self.MAIL_DATA.replace(b"Subject: Re: test", "Subject: s{}".format(uid % 10).encode())
+            self.write_file("old/{}/{}-x.eml".format(uid % 20, uid), data)
+
+        relayouter = self.create_relayouter("./new/{SUBJECT}/{UID}.eml", "./old/{MINUTE}/{UID}-{SUBJECT}.eml")
+        relayouter._workers = 8
+        relayouter.run()
+
+        new_files = [f for _, _, files in os.walk(os.path.join(self.test_path, "new")) for f in files]
+        self.assertEqual(len(new_files), 200)
+        self.assertEqual(os.listdir(os.path.join(self.test_path, "old")), [])
+
+    def test_relayout_message_index(self):
+        old_file = os.path.realpath(self.write_file("old/123-a.eml", self.MAIL_DATA))
+        duplicate_file = os.path.realpath(self.write_file("old/123-b.eml", self.MAIL_DATA))
+
+        index_path = os.path.join(self.test_path, "index.json")
+        index = MessageIndex(index_path)
+        index.add(["message-id:<a>"], old_file)
+        index.add(["message-id:<b>"], duplicate_file)
+        index.save()
+
+        relayouter = self.create_relayouter("./new/{UID}.eml", "./old/{UID}-{SUBJECT}.eml",
+                                            **{ConfigKey.MESSAGE_INDEX.value: "index.json"})
+        relayouter.run()
+
+        new_file = os.path.join(self.test_path, "new/123.eml")
+        index = MessageIndex(index_path)
+        index.load()
+        self.assertEqual(index.find(["message-id:<a>"], len(self.MAIL_DATA)), new_file)
+        self.assertEqual(index.find(["message-id:<b>"], len(self.MAIL_DATA)), new_file)  # removed duplicate
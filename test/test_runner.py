@@ -1,11 +1,16 @@
 import os
-import unittest
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
-from src.runner import Runner
+from mail_test_case import DummyMail, MailTestCase
+from src.config import ConfigKey
+from src.path_sharding import PathSharding
+from src.runner import ExistsMethod, Runner
 
 
-class TestRunner(unittest.TestCase):
+class TestRunner(MailTestCase):
+
+    TEST_DIR = "runner"
 
     def test_find_existing_file_or_new_mail_path_1(self):
         # test that file already exists!
@@ -55,3 +60,100 @@ class TestRunner(unittest.TestCase):
         expected_result = os.path.join(test_path, "orig.2.no-eml")
         self.assertEqual(result, expected_result)
         self.assertFalse(os.path.isfile(expected_result))
+
+    def test_parse_server_ids(self):
+        data = [b'1 (UID 17 EMAILID (M6d99ac3275bb4e))', b'2 (EMAILID (M5fdc09b49ea703) UID 18)', b')']
+        result = Runner.parse_server_ids(data, "EMAILID")
+        self.assertEqual(result, {"17": "EMAILID:M6d99ac3275bb4e", "18": "EMAILID:M5fdc09b49ea703"})
+
+        data = [b'1 (X-GM-MSGID 1278455344230334865 UID 5)']
+        result = Runner.parse_server_ids(data, "X-GM-MSGID")
+        self.assertEqual(result, {"5": "X-GM-MSGID:1278455344230334865"})
+
+    def test_handle_mail_copy_from_source(self):
+        source_path = self.write_file("source.eml", b"complete mail")
+        runner, folder_config = self.create_runner("./{YEAR}/{UID}.eml", **{ConfigKey.MESSAGE_INDEX.value: "index.json"})
+
+        runner.handle_mail(DummyMail(b"header only"), folder_config, source_path=source_path, index_keys=["message-id:<a>"])
+
+        mail_path = os.path.join(self.test_path, "2020/123.eml")
+        with open(mail_path, "rb") as file:
+            self.assertEqual(file.read(), b"complete mail")
+        self.assertEqual(runner._message_index.find(["message-id:<a>"], 13), mail_path)
+
+        runner.handle_mail(DummyMail(b"header only"), folder_config, source_path=mail_path, index_keys=["message-id:<a>"])
+        self.assertEqual(runner._count_skipped, 1)
+
+    def test_handle_mail_skip_registers_index(self):
+        mail_path = self.write_file("2020/123.eml", b"complete mail")
+        runner, folder_config = self.create_runner("./{YEAR}/{UID}.eml", **{ConfigKey.MESSAGE_INDEX.value: "index.json"})
+        folder_config.exists_method = ExistsMethod.SKIP
+
+        runner.handle_mail(DummyMail(b"other size"), folder_config, index_keys=["message-id:<a>"])
+        self.assertIsNone(runner._message_index.find(["message-id:<a>"], 13))
+
+        runner.handle_mail(DummyMail(b"complete mail"), folder_config, index_keys=["message-id:<b>"])
+        self.assertEqual(runner._message_index.find(["message-id:<b>"], 13), mail_path)
+        self.assertEqual(runner._count_skipped, 2)
+        self.assertEqual(runner._count_saved, 0)
+
+    def test_decode_broken_pool_on_shutdown(self):
+        class BrokenDecoder:
+            def decode(self, mails):
+                for mail in mails:
+                    yield mail, {}
+                    raise BrokenProcessPool("terminated")
+
+        runner, _ = self.create_runner("./{UID}.eml")
+        runner._mail_decoder = BrokenDecoder()
+
+        with self.assertRaises(BrokenProcessPool):
+            list(runner._decode(["a", "b"]))
+
+        runner._shutdown = True
+        self.assertEqual(list(runner._decode(["a", "b"])), [("a", {})])
+
+    def test_handle_mail_postfix_sharded(self):
+        self.write_file("2020/123.eml", b"first mail")
+        runner, folder_config = self.create_runner("./{YEAR}/{UID}.eml")
+        folder_config.shard_max_files = 1
+
+        runner.handle_mail(DummyMail(b"second mail"), folder_config)
+        postfix_path = PathSharding.get_shard_path(os.path.join(self.test_path, "2020/123.2.eml"))
+        with open(postfix_path, "rb") as file:
+            self.assertEqual(file.read(), b"second mail")
+        self.assertEqual(PathSharding.count_files(os.path.join(self.test_path, "2020")), 1)
+
+        runner.handle_mail(DummyMail(b"second mail"), folder_config)  # found in its shard
+        self.assertEqual(runner._count_saved, 1)
+        self.assertEqual(runner._count_skipped, 1)
+
+    def test_backup_folder_indexed_broken_pool_on_shutdown(self):
+        class HeaderMail:
+            def __init__(self, uid):
+                self.uid = str(uid)
+                self.size_rfc822 = 100
+                self.headers = {}
+
+        class DummyMailbox:
+            def __init__(self):
+                self.full_fetches = 0
+
+            def fetch(self, *_args, headers_only=False, **_kwargs):
+                if not headers_only:
+                    self.full_fetches += 1
+                return iter([HeaderMail(uid) for uid in range(1, 5)] if headers_only else [HeaderMail(1)])
+
+        class BrokenDecoder:
+            def decode(self, mails):
+                next(iter(mails))
+                runner._shutdown = True  # e.g. SIGTERM, which also terminated the decoder processes
+                raise BrokenProcessPool("terminated")
+
+        runner, folder_config = self.create_runner("./{UID}.eml", **{ConfigKey.MESSAGE_INDEX.value: "index.json"})
+        runner._mail_decoder = BrokenDecoder()
+        runner.FETCH_UID_CHUNK_SIZE = 1
+        mailbox = DummyMailbox()
+
+        runner._backup_folder_indexed(mailbox, folder_config, [], None)
+        self.assertEqual(mailbox.full_fetches, 1)  # no further chunk fetched
@@ -0,0 +1,94 @@
+import os
+
+import boto3
+from moto import mock_aws
+
+from mail_test_case import MailTestCase
+from src.config import ConfigKey
+from src.s3_mirror import S3Mirror
+
+
+@mock_aws
+class TestS3Mirror(MailTestCase):
+
+    TEST_DIR = "s3"
+    BUCKET = "mail-backup"
+
+    def setUp(self):
+        super().setUp()
+
+        self.config = {
+            ConfigKey.S3_REGION.value: "us-east-1",
+            ConfigKey.S3_BUCKET.value: self.BUCKET,
+            ConfigKey.S3_PREFIX.value: "backup/",
+            ConfigKey.S3_ACCESS_KEY.value: "testing",
+            ConfigKey.S3_SECRET_KEY.value: "testing",
+        }
+        self.client = boto3.client("s3", region_name="us-east-1")
+        self.client.create_bucket(Bucket=self.BUCKET)
+
+    def test_get_key(self):
+        mirror = S3Mirror(self.config, self.test_path)
+        self.assertEqual(mirror.get_key(os.path.join(self.test_path, "2020-09/mail.eml")), "backup/2020-09/mail.eml")
+        self.assertEqual(mirror.get_key("/outside/mail.eml"), "backup/outside/mail.eml")
+
+    def test_upload(self):
+        mail_path = self.write_file("2020-09/mail.eml", b"mail data")
+
+        mirror = S3Mirror(self.config, self.test_path)
+        mirror.load()
+        mirror.submit(mail_path)
+        mirror.close()
+        self.assertEqual(mirror._count_uploaded, 1)
+
+        result = self.client.get_object(Bucket=self.BUCKET, Key="backup/2020-09/mail.eml")
+        self.assertEqual(result["Body"].read(), b"mail data")
+
+        mirror = S3Mirror(self.config, self.test_path)
+        mirror.load()
+        mirror.submit(mail_path)  # known by manifest
+        mirror.close()
+        self.assertEqual(mirror._count_uploaded, 0)
+
+    def test_multipart_upload(self):
+        self.config[ConfigKey.S3_MULTIPART_THRESHOLD.value] = 5 * 1024 * 1024
+        data = os.urandom(11 * 1024 * 1024)
+        mail_path = self.write_file("big.eml", data)
+
+        mirror = S3Mirror(self.config, self.test_path)
+        mirror.submit(mail_path)
+        mirror.close()
+
+        result = self.client.head_object(Bucket=self.BUCKET, Key="backup/big.eml")
+        self.assertEqual(result["ContentLength"], len(data))
+        self.assertTrue(result["ETag"].endswith('-3"'))  # 3 parts
+
+    def test_move(self):
+        old_path = self.write_file("old/mail.eml", b"mail data")
+        duplicate_path = self.write_file("old/duplicate.eml", b"mail data")
+        mirror = S3Mirror(self.config, self.test_path)
+        mirror.submit(old_path)
+        mirror.submit(duplicate_path)
+        mirror.close()
+
+        new_path = os.path.join(self.test_path, "new/mail.eml")
+        os.makedirs(os.path.dirname(new_path))
+        os.rename(old_path, new_path)
+        os.remove(duplicate_path)
+
+        mirror = S3Mirror(self.config, self.test_path)
+        mirror.load()
+        mirror.move(old_path, new_path)
+        mirror.close()
+        mirror = S3Mirror(self.config, self.test_path)
+        mirror.load()
+        mirror.move(duplicate_path, new_path)  # identical file, already uploaded
+        mirror.submit(new_path)  # known by manifest
+        mirror.close()
+        self.assertEqual(mirror._count_moved, 1)
+        self.assertEqual(mirror._count_uploaded, 0)
+
+        result = self.client.list_objects_v2(Bucket=self.BUCKET)
+        self.assertEqual([o["Key"] for o in result["Contents"]], ["backup/new/mail.eml"])
+        result = self.client.get_object(Bucket=self.BUCKET, Key="backup/new/mail.eml")
+        self.assertEqual(result["Body"].read(), b"mail data")